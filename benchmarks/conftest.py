@@ -0,0 +1,86 @@
+"""
+Benchmark suite of the parse/index/load/query pipeline, over synthetic
+archives of several sizes.
+Run with: `pytest benchmarks/ [--archive-sizes=4,16,64,256]`
+A summary of the scaling curves (time per day of data) and peak memory of
+each benchmark is printed at the end of the session.
+"""
+import tracemalloc
+import collections
+import pytest
+from radcalnet.testing import make_store
+
+
+instruments = ('RVUS01', 'LCFR01', 'BTCN02', 'GONA01')
+
+
+def pytest_addoption(parser):
+    parser.addoption('--archive-sizes', default='4,16,64',
+                     help='comma-separated numbers of days per site of the '
+                          'synthetic archives')
+
+
+def pytest_generate_tests(metafunc):
+    if 'ndays' in metafunc.fixturenames:
+        sizes = metafunc.config.getoption('archive_sizes')
+        metafunc.parametrize('ndays', [int(size) for size in sizes.split(',')])
+
+
+@pytest.fixture(scope='session')
+def synthetic_store(tmp_path_factory):
+    """
+    Factory for synthetic stores, cached by their number of days.
+    Stores hold 4 sites, with days spread over several years, and some fill
+    values. Returns the store path, and the paths of the BTCN files.
+    """
+    stores = {}
+
+    def factory(ndays):
+        if ndays not in stores:
+            path = str(tmp_path_factory.mktemp('store_{}'.format(ndays)))
+            paths = make_store(path, instruments, ndays=ndays, day_step=7,
+                               fill_fraction=0.2)
+            stores[ndays] = path, [p for p in paths if '/BTCN/' in p]
+        return stores[ndays]
+    return factory
+
+
+_scaling = collections.defaultdict(dict)
+
+
+def _peak_memory(func, *args, **kwargs):
+    tracemalloc.start()
+    try:
+        func(*args, **kwargs)
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+@pytest.fixture
+def scaling(request, benchmark):
+    """
+    Benchmark `func(*args, **kwargs)`, and record its mean time and peak
+    memory against the archive size `ndays`, for the session summary.
+    """
+    def run(ndays, func, *args, **kwargs):
+        result = benchmark(func, *args, **kwargs)
+        peak = _peak_memory(func, *args, **kwargs)
+        benchmark.extra_info['peak_memory'] = peak
+        if benchmark.stats is not None:
+            name = request.node.originalname
+            _scaling[name][ndays] = (benchmark.stats.stats.mean, peak)
+        return result
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not _scaling:
+        return
+    terminalreporter.section('scaling')
+    terminalreporter.write_line('{:<32}{:>8}{:>12}{:>14}{:>12}'.format(
+        'benchmark', 'days', 'mean [ms]', 'per day [us]', 'peak [MB]'))
+    for name, results in sorted(_scaling.items()):
+        for ndays, (mean, peak) in sorted(results.items()):
+            terminalreporter.write_line('{:<32}{:>8}{:>12.2f}{:>14.1f}{:>12.2f}'.format(
+                name, ndays, mean * 1e3, mean / ndays * 1e6, peak / 2**20))
@@ -0,0 +1,36 @@
+"""
+Benchmarks for queries over exported columnar datasets:
+3 bands over a month or a year, against loading the daily files.
+"""
+import datetime as dt
+import pytest
+from radcalnet.data_store import DataStore
+
+pytest.importorskip('pyarrow')
+from radcalnet.export import ColumnarStore, export_store  # noqa: E402
+
+
+bands = [490, 560, 660]
+windows = dict(month=(dt.datetime(2018, 6, 1), dt.datetime(2018, 7, 1)),
+               year=(dt.datetime(2018, 6, 1), dt.datetime(2019, 6, 1)))
+
+
+@pytest.fixture(scope='module', params=['parquet', 'arrow'])
+def exported(request, synthetic_store, tmp_path_factory):
+    path, _ = synthetic_store(64)
+    dest = str(tmp_path_factory.mktemp('export'))
+    export_store(DataStore(path), dest, fmt=request.param, row_group_size=64)
+    return ColumnarStore(dest, request.param)
+
+
+@pytest.mark.parametrize('window', sorted(windows))
+def test_columnar_query(benchmark, exported, window):
+    ms = benchmark(exported.get_measuremets, 'BTCN', *windows[window], wavelengths=bands)
+    assert list(ms.toa.columns) == bands
+
+
+@pytest.mark.parametrize('window', sorted(windows))
+def test_datastore_query(benchmark, synthetic_store, window):
+    path, _ = synthetic_store(64)
+    ds = DataStore(path)
+    benchmark(lambda: ds.get_measuremets('BTCN', *windows[window]).toa[bands])
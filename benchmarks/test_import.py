@@ -0,0 +1,15 @@
+"""
+Benchmarks of the import time of the parsing, index and table layers,
+each in a fresh interpreter.
+"""
+import sys
+import subprocess
+import pytest
+
+
+@pytest.mark.parametrize('module', ['radcalnet.daily_file', 'radcalnet.data_store',
+                                    'radcalnet.site_measurements', 'radcalnet.plotting'])
+def test_import(benchmark, module):
+    cmd = [sys.executable, '-c', 'import ' + module]
+    benchmark.pedantic(subprocess.run, args=(cmd,), kwargs=dict(check=True),
+                       rounds=5, iterations=1)
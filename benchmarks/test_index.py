@@ -0,0 +1,32 @@
+"""
+Benchmarks for filename parsing and DataStore indexing.
+"""
+import os
+from radcalnet.data_store import DataStore
+from radcalnet.file_handle import DailyFileHandle
+
+
+def test_file_handles(scaling, synthetic_store, ndays):
+    _, paths = synthetic_store(ndays)
+    scaling(ndays, lambda: [DailyFileHandle(path) for path in paths])
+
+
+def test_index(scaling, synthetic_store, ndays):
+    path, _ = synthetic_store(ndays)
+
+    def index():
+        ds = DataStore(path)
+        return [ds.site_index[site] for site in ds.site_dirs]
+    scaling(ndays, index)
+
+
+def test_index_snapshot(scaling, synthetic_store, ndays, tmp_path):
+    path, _ = synthetic_store(ndays)
+    index_path = str(tmp_path / 'index.json')
+    DataStore(path, index_path=index_path).refresh()
+    assert os.path.exists(index_path)
+
+    def index():
+        ds = DataStore(path, index_path=index_path)
+        return [ds.site_index[site] for site in ds.site_dirs]
+    scaling(ndays, index)
@@ -0,0 +1,104 @@
+"""
+Benchmarks for parsing daily files and loading measurements.
+Time per day of data should stay roughly constant as the archive grows.
+"""
+import os
+import tarfile
+import zipfile
+import datetime as dt
+import pytest
+from radcalnet.cache import MemoryCache
+from radcalnet.data_store import DataStore
+from radcalnet.daily_file import read_daily_arrays, read_daily_file
+from radcalnet.live import LiveSiteMeasurements
+from radcalnet.site_measurements import SiteMeasurements
+
+
+def test_read_daily_file(scaling, synthetic_store, ndays):
+    _, paths = synthetic_store(ndays)
+    scaling(ndays, lambda: [read_daily_file(path) for path in paths])
+
+
+def test_read_daily_arrays(scaling, synthetic_store, ndays):
+    _, paths = synthetic_store(ndays)
+    scaling(ndays, lambda: [read_daily_arrays(path) for path in paths])
+
+
+def test_from_pathlist(scaling, synthetic_store, ndays):
+    _, paths = synthetic_store(ndays)
+    sm = scaling(ndays, SiteMeasurements.from_pathlist, paths)
+    assert len(sm.weather) == 13 * ndays
+
+
+@pytest.mark.parametrize('projection', [
+    {}, dict(tables=['toa']), dict(tables=['toa'], wavelengths=[490, 560, 660], weather=['AOD'])],
+    ids=['full', 'toa', 'toa-subset'])
+def test_from_pathlist_projection(benchmark, synthetic_store, projection):
+    _, paths = synthetic_store(64)
+    sm = benchmark(SiteMeasurements.from_pathlist, paths, **projection)
+    assert len(sm.toa) == 13 * 64
+
+
+@pytest.mark.parametrize('workers', [None, 2, 4])
+def test_from_pathlist_workers(benchmark, synthetic_store, workers):
+    _, paths = synthetic_store(64)
+    benchmark.extra_info['nfiles'] = len(paths)
+    sm = benchmark(SiteMeasurements.from_pathlist, paths, workers=workers)
+    assert len(sm.weather) == 13 * 64
+
+
+@pytest.mark.parametrize('memory_cache', [False, True])
+def test_sliding_window(benchmark, synthetic_store, memory_cache):
+    """
+    An 8 week window moving forward a week at a time (files are a week apart)
+    """
+    path, _ = synthetic_store(64)
+    start = dt.datetime(2018, 1, 1)
+    windows = [(start + dt.timedelta(weeks=i), start + dt.timedelta(weeks=i + 8))
+               for i in range(56)]
+
+    def slide():
+        ds = DataStore(path, memory_cache=MemoryCache() if memory_cache else None)
+        return [ds.get_measuremets('BTCN', *window) for window in windows]
+    benchmark(slide)
+
+
+@pytest.mark.parametrize('layout', ['dir', 'zip', 'tar'])
+def test_archive_store(benchmark, synthetic_store, tmp_path, layout):
+    path, paths = synthetic_store(64)
+    if layout == 'zip':
+        path = str(tmp_path / 'store.zip')
+        with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for fname in paths:
+                zf.write(fname, os.path.relpath(fname, os.path.dirname(path)))
+    elif layout == 'tar':
+        path = str(tmp_path / 'store.tar')
+        with tarfile.open(path, 'w') as tf:
+            for fname in paths:
+                tf.add(fname, os.path.basename(fname))
+    sm = benchmark(lambda: DataStore(path).get_measuremets('BTCN'))
+    assert len(sm.weather) == 13 * 64
+
+
+@pytest.mark.parametrize('mode', ['rebuild', 'live'])
+def test_rolling_window(benchmark, synthetic_store, mode):
+    """
+    Updates of a window of the last 8 days of data (a week apart), as each
+    day's files arrive
+    """
+    _, paths = synthetic_store(64)
+    days = [paths[i:i + 2] for i in range(0, len(paths), 2)]
+
+    def update_all():
+        if mode == 'live':
+            live = LiveSiteMeasurements(retention='52D')
+            for day in days:
+                live.append_files(day)
+            return live
+        window = []
+        for day in days:
+            window = window[-2 * 7:] + day
+            sm = SiteMeasurements.from_pathlist(window)
+        return sm
+    sm = benchmark(update_all)
+    assert len(sm.toa) == 13 * 8
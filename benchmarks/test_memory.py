@@ -0,0 +1,17 @@
+"""
+Memory footprint of loaded measurements.
+Run with: `pytest benchmarks/test_memory.py -s`
+"""
+from radcalnet.data_store import DataStore
+
+
+def test_compact_memory(benchmark, synthetic_store, ndays):
+    path, _ = synthetic_store(ndays)
+    ds = DataStore(path)
+    ms = ds.get_measuremets('BTCN')
+    cms = benchmark(ds.get_measuremets, 'BTCN', compact=True)
+    benchmark.extra_info['frames_bytes'] = ms.memory_usage()
+    benchmark.extra_info['compact_bytes'] = cms.memory_usage()
+    print('\n{} days: {:.1f} MB as frames, {:.1f} MB compact'.format(
+        ndays, ms.memory_usage() / 2**20, cms.memory_usage() / 2**20))
+    assert cms.memory_usage() < 0.6 * ms.memory_usage()
@@ -0,0 +1,75 @@
+"""
+Benchmarks for operations on loaded measurements.
+"""
+import io
+import operator
+import functools
+import datetime as dt
+import pandas as pd
+import pytest
+from radcalnet.site_measurements import SiteMeasurements
+
+
+def test_slice(scaling, synthetic_store, ndays):
+    _, paths = synthetic_store(ndays)
+    sm = SiteMeasurements.from_pathlist(paths)
+    start, stop = sm.weather.index[len(sm.weather) // 4], sm.weather.index[-len(sm.weather) // 4]
+    scaling(ndays, sm.__getitem__, slice(start, stop))
+
+
+def test_add(scaling, synthetic_store, ndays):
+    _, paths = synthetic_store(ndays)
+    sm = SiteMeasurements.from_pathlist(paths)
+    middle = sm.weather.index[len(sm.weather) // 2]
+    first, second = sm[:middle], sm[middle + dt.timedelta(seconds=1):]
+    merged = scaling(ndays, first.__add__, second)
+    assert len(merged.weather) == len(sm.weather)
+
+
+def _days(sm):
+    return [sm[day:day + dt.timedelta(days=1, microseconds=-1)]
+            for day in sm.weather.index.normalize().unique()]
+
+
+def test_concat(scaling, synthetic_store, ndays):
+    _, paths = synthetic_store(ndays)
+    days = _days(SiteMeasurements.from_pathlist(paths))
+    merged = scaling(ndays, SiteMeasurements.concat, days)
+    assert len(merged.weather) == 13 * ndays
+
+
+def test_chained_add(scaling, synthetic_store, ndays):
+    """
+    Baseline: `sum`-like accumulation of the days with `+`
+    """
+    _, paths = synthetic_store(ndays)
+    days = _days(SiteMeasurements.from_pathlist(paths))
+    merged = scaling(ndays, functools.reduce, operator.add, days)
+    assert len(merged.weather) == 13 * ndays
+
+
+def test_resample(scaling, synthetic_store, ndays):
+    _, paths = synthetic_store(ndays)
+    sm = SiteMeasurements.from_pathlist(paths)
+    daily, _ = scaling(ndays, sm.resample, '1D')
+    assert len(daily.toa) == ndays
+
+
+def test_interpolate_to(scaling, synthetic_store, ndays):
+    _, paths = synthetic_store(ndays)
+    sm = SiteMeasurements.from_pathlist(paths)
+    times = pd.date_range(sm.weather.index[0], sm.weather.index[-1], freq='1h')
+    scaling(ndays, sm.interpolate_to, times, '2h')
+
+
+@pytest.mark.parametrize('decimate', [None, 800])
+def test_plot(benchmark, synthetic_store, decimate):
+    from radcalnet.plotting import plt
+    _, paths = synthetic_store(64)
+    sm = SiteMeasurements.from_pathlist(paths)
+
+    def plot():
+        fig = sm.plot('toa', range(400, 1000, 50), show=False, decimate=decimate)
+        fig.savefig(io.BytesIO(), format='png')
+        plt.close(fig)
+    benchmark(plot)
@@ -0,0 +1,41 @@
+"""
+Benchmarks for time lookups on loaded measurements.
+"""
+import numpy as np
+import pytest
+from radcalnet.site_measurements import SiteMeasurements
+
+
+@pytest.fixture(scope='module')
+def measurements(synthetic_store):
+    _, paths = synthetic_store(64)
+    return SiteMeasurements.from_pathlist(paths)
+
+
+@pytest.fixture(scope='module')
+def overpasses(measurements):
+    rng = np.random.RandomState(0)
+    times = measurements.toa.index.values
+    offsets = rng.randint(-20, 20, 10000).astype('timedelta64[m]')
+    return rng.choice(times, 10000) + offsets
+
+
+def test_nearest(benchmark, measurements, overpasses):
+    rows, offsets = benchmark(measurements.nearest, overpasses, '15min')
+    assert len(rows) == len(overpasses)
+
+
+def test_within(benchmark, measurements, overpasses):
+    benchmark(measurements.within, overpasses, '30min')
+
+
+def test_nearest_loc(benchmark, measurements, overpasses):
+    """
+    Baseline: a pandas lookup per overpass
+    """
+    toa = measurements.toa
+
+    def lookup(times):
+        return [toa.iloc[toa.index.get_indexer([t], method='nearest')[0]]
+                for t in times]
+    benchmark(lookup, overpasses[:1000])
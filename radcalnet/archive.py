@@ -0,0 +1,271 @@
+"""
+Consolidated binary archive of daily files.
+Each instrument gets a directory holding a JSON header, and one raw binary
+file per table. Tables share a single time index (one row per timestamp),
+so time slices are read through memory mapping, and new days are appended
+without rewriting existing data.
+
+Usage: python -m radcalnet.archive DATASTORE_DIR ARCHIVE_DIR [--site SITE]
+"""
+import os
+import json
+import argparse
+import itertools
+import numpy as np
+import pandas as pd
+from . import containers
+from .data_store import DataStore
+from .file_handle import DailyFileHandle
+from .loading import _read_dailyfile, _filehandle_key, _meta_coords, _stage_tables
+from .site_measurements import SiteMeasurements
+
+
+_stage_flags = {'input': 1, 'output': 2}
+
+
+class SiteArchive:
+    """
+    Consolidated archive of the measurements of a single instrument.
+    Rows of both files of a day are aligned on the union of their
+    timestamps (where both files hold weather data for the same timestamp,
+    the `.output` file prevails). A per-row flag records which of the
+    `.input`/`.output` files covered the row, so slicing gives the same
+    tables as loading the daily files, up to the storage type of the sr,
+    toa tables and their errors (float32 by default, which keeps about 7
+    significant digits; use float64 for the exact values).
+    """
+    header_name = 'header.json'
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, self.header_name), 'rt') as f:
+            self.header = json.load(f)
+        self._arrays = {}
+
+    @classmethod
+    def create(cls, path, meta, weather_keys, wavelengths, dtype='float32'):
+        """
+        Create an empty archive.
+        :param meta: dict with the instrument, site and its coordinates
+        :param dtype: storage type of the sr, toa tables and their errors
+        """
+        os.makedirs(path, exist_ok=True)
+        header = dict(meta=meta, weather_keys=list(weather_keys),
+                      wavelengths=[int(wv) for wv in wavelengths],
+                      dtype=np.dtype(dtype).name, nrows=0, files=[])
+        _write_header(path, header)
+        return cls(path)
+
+    @property
+    def meta(self):
+        return self.header['meta']
+
+    def __len__(self):
+        return self.header['nrows']
+
+    def _layout(self):
+        """
+        :return: dict of array name -> (dtype, number of columns or None)
+        """
+        nweather = len(self.header['weather_keys'])
+        nwavelengths = len(self.header['wavelengths'])
+        layout = dict(times=('datetime64[ns]', None), stages=('uint8', None),
+                      types=('U1', None), weather=('float64', nweather),
+                      weather_errs=('float64', nweather))
+        for key in ['sr', 'sr_errs', 'toa', 'toa_errs']:
+            layout[key] = (self.header['dtype'], nwavelengths)
+        return layout
+
+    def _array(self, name):
+        """
+        Memory-mapped (read only) array
+        """
+        if name not in self._arrays:
+            dtype, ncols = self._layout()[name]
+            shape = (len(self),) if ncols is None else (len(self), ncols)
+            if len(self) == 0:
+                arr = np.empty(shape, dtype)
+            else:
+                arr = np.memmap(os.path.join(self.path, name + '.bin'),
+                                dtype=dtype, mode='r', shape=shape)
+            self._arrays[name] = arr
+        return self._arrays[name]
+
+    @property
+    def times(self):
+        return self._array('times')
+
+    def __getitem__(self, key):
+        """
+        Take a time slice (inclusive, as `SiteMeasurements.__getitem__`),
+        reading only the matching rows.
+        """
+        assert isinstance(key, slice)
+        assert key.step is None
+        times = self.times
+        sind = (0 if key.start is None else
+                np.searchsorted(times, np.datetime64(key.start, 'ns'), side='left'))
+        eind = (len(times) if key.stop is None else
+                np.searchsorted(times, np.datetime64(key.stop, 'ns'), side='right'))
+        return self._measurements(slice(sind, eind))
+
+    def get_measurements(self, fromtime=None, totime=None):
+        return self[fromtime:totime]
+
+    def _measurements(self, rows):
+        index = pd.DatetimeIndex(np.array(self.times[rows]))
+        stages = np.array(self._array('stages')[rows])
+        weather_keys = self.header['weather_keys']
+        wavelengths = self.header['wavelengths']
+        weather = pd.DataFrame(np.array(self._array('weather')[rows]),
+                               index=index, columns=weather_keys)
+        weather['Type'] = np.array(self._array('types')[rows], dtype=object)
+        weather_errs = pd.DataFrame(np.array(self._array('weather_errs')[rows]),
+                                    index=index, columns=weather_keys)
+        tables = {}
+        for stage, flag in _stage_flags.items():
+            mask = (stages & flag) != 0
+            for key in _stage_tables[stage]:
+                tables[key] = pd.DataFrame(
+                    np.array(self._array(key)[rows])[mask],
+                    index=index[mask], columns=wavelengths)
+        return SiteMeasurements(weather, weather_errs,
+                                tables['sr'], tables['sr_errs'],
+                                tables['toa'], tables['toa_errs'],
+                                dict(self.meta))
+
+    def append_files(self, paths, cache=None):
+        """
+        Append the data of daily files, skipping files already included.
+        New days must follow the last day already in the archive.
+        :return: number of appended rows
+        """
+        included = set(self.header['files'])
+        handles = sorted(
+            (DailyFileHandle(path) for path in paths
+             if containers.basename(path) not in included),
+            key=lambda handle: containers.basename(handle.path))
+        last_time = self.times[-1] if len(self) else None
+        blocks = {name: [] for name in self._layout()}
+        files = []
+        for key, day_handles in itertools.groupby(handles, _filehandle_key):
+            if key[0] != self.meta['instrument']:
+                continue
+            day_handles = list(day_handles)
+            assert len(day_handles) in {1, 2}, 'Duplicate input files?'
+            day = self._day_rows(day_handles, cache)
+            # files without any sample are only recorded as included
+            files.extend(containers.basename(handle.path) for handle in day_handles)
+            if not len(day['times']):
+                continue
+            assert last_time is None or day['times'][0] > last_time, \
+                'Appended data must follow the archived data'
+            last_time = day['times'][-1]
+            for name, arr in day.items():
+                blocks[name].append(arr)
+        if not files:
+            return 0
+
+        nrows = len(self)
+        layout = self._layout()
+        for name, arrays in blocks.items():
+            if not arrays:
+                break
+            dtype, ncols = layout[name]
+            rowsize = np.dtype(dtype).itemsize * (ncols or 1)
+            with open(os.path.join(self.path, name + '.bin'), 'ab') as f:
+                f.truncate(nrows * rowsize)  # drop leftovers of failed appends
+                f.write(np.concatenate(arrays).astype(dtype).tobytes())
+        nappended = sum(len(arr) for arr in blocks['times'])
+        self.header['nrows'] = nrows + nappended
+        self.header['files'].extend(files)
+        _write_header(self.path, self.header)
+        self._arrays = {}
+        return nappended
+
+    def _day_rows(self, handles, cache):
+        """
+        Align the files of a single day on their joint time index
+        """
+        day_arrays = []
+        for handle in handles:
+            arrays = _read_dailyfile(handle.path, cache)
+            assert arrays.metadata['Site'] == self.meta['instrument'], \
+                'File metadata not matching expected data'
+            assert _meta_coords(arrays.metadata) == _meta_coords(self.meta), \
+                'Site coordinates not matching other files'
+            assert arrays.weather_keys == self.header['weather_keys']
+            assert arrays.wavelengths.tolist() == self.header['wavelengths']
+            day_arrays.append((handle.stage, arrays))
+
+        times = np.unique(np.concatenate([arrays.times for _, arrays in day_arrays]))
+        layout = self._layout()
+        day = {}
+        for name, (dtype, ncols) in layout.items():
+            shape = (len(times),) if ncols is None else (len(times), ncols)
+            day[name] = np.full(shape, np.nan) if ncols else np.zeros(shape, dtype)
+        day['times'] = times
+        for stage, arrays in day_arrays:
+            rows = np.searchsorted(times, arrays.times)
+            day['stages'][rows] |= _stage_flags[stage]
+            day['types'][rows] = arrays.types
+            day['weather'][rows] = arrays.weather
+            day['weather_errs'][rows] = arrays.weather_errs
+            srf_key, srf_errs_key = _stage_tables[stage]
+            day[srf_key][rows] = arrays.srf
+            day[srf_errs_key][rows] = arrays.srf_errs
+        return day
+
+
+def _write_header(path, header):
+    tmp = os.path.join(path, SiteArchive.header_name + '.tmp')
+    with open(tmp, 'wt') as f:
+        json.dump(header, f)
+    os.replace(tmp, os.path.join(path, SiteArchive.header_name))
+
+
+def consolidate(store, dest, sites=None, dtype='float32', cache=None):
+    """
+    Consolidate the daily files of a `DataStore` into a `SiteArchive` per
+    instrument, under `dest/<instrument>`. Existing archives are updated
+    with the files they do not include yet.
+    :return: dict of instrument -> `SiteArchive`
+    """
+    archives = {}
+    for site in sorted(store.site_dirs if sites is None else sites):
+        index = store.site_index[site]
+        handles = sorted(index.handles, key=lambda handle: handle.instrument)
+        for instrument, inst_handles in itertools.groupby(
+                handles, lambda handle: handle.instrument):
+            paths = [handle.path for handle in inst_handles]
+            path = os.path.join(dest, instrument)
+            if os.path.exists(os.path.join(path, SiteArchive.header_name)):
+                archive = SiteArchive(path)
+            else:
+                arrays = _read_dailyfile(paths[0], cache)
+                meta = dict(site=instrument[:4], instrument=instrument)
+                meta.update((key, arrays.metadata[key]) for key in ['Lon', 'Lat', 'Alt'])
+                archive = SiteArchive.create(path, meta, arrays.weather_keys,
+                                             arrays.wavelengths, dtype)
+            archive.append_files(paths, cache)
+            archives[instrument] = archive
+    return archives
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Consolidate a directory of RadCalNet daily files into '
+                    'binary archives (or update existing archives)')
+    parser.add_argument('datastore', help='directory with a sub-directory per site')
+    parser.add_argument('dest', help='archive directory')
+    parser.add_argument('--site', action='append', help='site to consolidate (default: all)')
+    parser.add_argument('--dtype', default='float32', choices=['float32', 'float64'],
+                        help='storage type of reflectance tables')
+    args = parser.parse_args(argv)
+    archives = consolidate(DataStore(args.datastore), args.dest, args.site, args.dtype)
+    for instrument, archive in sorted(archives.items()):
+        print('{}: {} rows'.format(instrument, len(archive)))
+
+
+if __name__ == '__main__':
+    main()
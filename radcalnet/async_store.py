@@ -0,0 +1,127 @@
+"""
+Asyncio interface to a `DataStore`, for serving measurements without
+blocking the event loop.
+"""
+import io
+import asyncio
+import functools
+import concurrent.futures
+from .containers import read_text
+from .data_store import DataStore
+from .daily_file import read_daily_arrays
+from .loading import (
+    _mask_fill_values, _read_item, _select_handles, _plan_reads, _call_counted)
+
+
+def _parse_text(text, wavelengths=None, weather=None):
+    return _mask_fill_values(read_daily_arrays(io.StringIO(text), wavelengths, weather))
+
+
+def _copy(sm):
+    """
+    Copy of measurements, not sharing any table
+    """
+    from .site_measurements import SiteMeasurements, _table_columns
+    from .compact import CompactSiteMeasurements
+    if isinstance(sm, CompactSiteMeasurements):
+        return CompactSiteMeasurements(sm.weather.copy(), sm.weather_errs.copy(),
+                                       sm.times.copy(), sm.wavelengths.copy(),
+                                       sm.values.copy(), sm.present.copy(), dict(sm.meta))
+    return SiteMeasurements(*[getattr(sm, key).copy() for key in _table_columns],
+                            dict(sm.meta))
+
+
+class AsyncDataStore:
+    """
+    Asynchronous counterpart of `DataStore.get_measuremets`.
+    Directory listings, file reads and building the tables run in a pool of
+    `io_workers` threads; parsing runs in `executor` (by default, a pool of
+    `workers` threads; a process pool may be passed instead).
+    Concurrent identical requests share a single load, and at most
+    `max_pending` distinct requests are loaded at a time (the others wait,
+    without holding any data), to bound the memory used by request bursts.
+    Instances are meant to be used from a single event loop.
+    :param store: `DataStore`, or path of its directory
+    """
+    def __init__(self, store, executor=None, workers=4, io_workers=4, max_pending=8):
+        self.store = store if isinstance(store, DataStore) else DataStore(store)
+        self._own_executor = executor is None
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor(workers)
+        self._io = concurrent.futures.ThreadPoolExecutor(io_workers)
+        self._pending = asyncio.Semaphore(max_pending)
+        self._inflight = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self._io.shutdown(wait=False)
+        if self._own_executor:
+            self.executor.shutdown(wait=False)
+
+    async def get_measurements(self, site, fromtime=None, totime=None, compact=False,
+                               skip_empty=False, tables=None, wavelengths=None, weather=None):
+        """
+        Load the measurements of `site` in the given time range.
+        See `DataStore.get_measuremets`, for the other arguments.
+        Requests coalesced with a load in progress get a copy of its result.
+        """
+        options = dict(compact=compact, skip_empty=skip_empty, tables=tables,
+                       wavelengths=wavelengths, weather=weather)
+        key = (site, fromtime, totime) + tuple(
+            value if value is None or isinstance(value, bool) else tuple(value)
+            for value in options.values())
+        task = self._inflight.get(key)
+        coalesced = task is not None
+        if not coalesced:
+            task = asyncio.ensure_future(self._load(site, fromtime, totime, **options))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # a cancelled request must not cancel the load shared with others
+        sm = await asyncio.shield(task)
+        return _copy(sm) if coalesced else sm
+
+    async def _load(self, site, fromtime, totime, compact, skip_empty, tables,
+                    wavelengths, weather):
+        loop = asyncio.get_running_loop()
+        async with self._pending:
+            if self.store.memory_cache is not None:
+                # days are taken from (and added to) the memory cache
+                return await loop.run_in_executor(self._io, functools.partial(
+                    self.store.get_measuremets, site, fromtime, totime, self.executor,
+                    compact=compact, skip_empty=skip_empty, tables=tables,
+                    wavelengths=wavelengths, weather=weather))
+            meta, handles = await loop.run_in_executor(
+                self._io, self._select, site, fromtime, totime)
+            handles, items = _plan_reads(handles, tables, wavelengths)
+            parsed = await asyncio.gather(
+                *[self._parse(loop, item, weather) for item in items])
+            return await loop.run_in_executor(self._io, functools.partial(
+                self._build, handles, parsed, meta, slice(fromtime, totime), compact,
+                skip_empty, tables, weather, wavelengths))
+
+    async def _parse(self, loop, item, weather):
+        if self.store.cache is not None:
+            arrays, stats = await loop.run_in_executor(
+                self.executor, functools.partial(_call_counted, functools.partial(
+                    _read_item, weather=weather), self.store.cache, item))
+            if stats is not None:
+                self.store.cache._add_stats(stats)
+            return arrays
+        path, wavelengths = item
+        text = await loop.run_in_executor(self._io, read_text, path)
+        return await loop.run_in_executor(self.executor, _parse_text, text, wavelengths, weather)
+
+    def _select(self, site, fromtime, totime):
+        return _select_handles(self.store.site_index[site][fromtime:totime])
+
+    @staticmethod
+    def _build(handles, parsed, meta, window, compact, skip_empty, tables, weather, wavelengths):
+        from .site_measurements import SiteMeasurements
+        from .compact import CompactSiteMeasurements
+        cls = CompactSiteMeasurements if compact else SiteMeasurements
+        return cls._from_parsed(handles, parsed, meta, skip_empty, tables, weather,
+                                wavelengths)[window]
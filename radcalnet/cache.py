@@ -0,0 +1,211 @@
+"""
+Caching of parsed daily files.
+"""
+import os
+import json
+import hashlib
+import threading
+import collections
+import numpy as np
+from . import instrumentation, containers
+from .daily_file import DailyArrays
+from .loading import _count_missing
+
+
+class FileCache:
+    """
+    Persistent on-disk cache of parsed daily files, stored as `.npz` files.
+    Entries are keyed by the file's path, size and modification time, so a
+    modified file is parsed again. Once the cache grows beyond `max_bytes`,
+    least recently used entries are evicted.
+    The cache may be passed to worker processes (see
+    `SiteMeasurements.from_pathlist`): the hits, misses and size of their
+    copies are added to those of the cache in the process that created it
+    (`pid`). The cache may be shared by threads.
+    """
+    suffix = '.npz'
+
+    def __init__(self, path, max_bytes=1 << 30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self.pid = os.getpid()
+        self._lock = threading.Lock()  # of the stats
+        os.makedirs(path, exist_ok=True)
+        self._nbytes = sum(size for _, _, size in self._entries())
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _entries(self):
+        """
+        :return: list of (entry path, last access time, size)
+        """
+        entries = []
+        for fname in os.listdir(self.path):
+            if not fname.endswith(self.suffix):
+                continue
+            entry = os.path.join(self.path, fname)
+            try:
+                st = os.stat(entry)
+            except FileNotFoundError:  # evicted by another process
+                continue
+            entries.append((entry, st.st_mtime_ns, st.st_size))
+        return entries
+
+    def _stats(self):
+        return self.hits, self.misses, self._nbytes
+
+    def _add_stats(self, stats):
+        hits, misses, nbytes = stats
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+            self._nbytes += nbytes
+
+    def _entry_path(self, path):
+        st = containers.stat(path)
+        key = '{}\0{}\0{}'.format(os.path.abspath(path), st.st_size, st.st_mtime_ns)
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.path, digest + self.suffix)
+
+    def get(self, path, loader):
+        """
+        Return the `DailyArrays` of `path`, calling `loader(path)` to parse it
+        if not cached yet.
+        """
+        entry = self._entry_path(path)
+        try:
+            arrays = self._read(entry)
+        except (ValueError, KeyError, OSError):
+            pass
+        else:
+            with self._lock:
+                self.hits += 1
+            instrumentation.count('cache_hits')
+            try:
+                os.utime(entry)  # mark as recently used
+            except FileNotFoundError:  # evicted by another process
+                pass
+            return arrays
+
+        with self._lock:
+            self.misses += 1
+        instrumentation.count('cache_misses')
+        arrays = loader(path)
+        self._write(entry, arrays)
+        return arrays
+
+    def _read(self, entry):
+        with np.load(entry, allow_pickle=False) as npz:
+            fields = {key: npz[key] for key in npz.files}
+        fields['metadata'] = json.loads(str(fields['metadata']))
+        fields['weather_keys'] = fields['weather_keys'].tolist()
+        return _count_missing(DailyArrays(**fields))
+
+    def _write(self, entry, arrays):
+        fields = arrays._asdict()
+        del fields['missing']  # counted again on reading
+        fields['metadata'] = np.array(json.dumps(fields['metadata']))
+        fields['weather_keys'] = np.array(fields['weather_keys'])
+        tmp = '{}.{}.{}.tmp'.format(entry, os.getpid(), threading.get_ident())
+        try:
+            with open(tmp, 'wb') as f:
+                np.savez(f, **fields)
+            nbytes = os.path.getsize(tmp)
+            try:
+                nbytes -= os.path.getsize(entry)  # written by another thread or process
+            except FileNotFoundError:
+                pass
+            os.replace(tmp, entry)  # atomic, in case of concurrent writers
+        except Exception:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            self._nbytes += nbytes
+            full = self._nbytes > self.max_bytes
+        if full:
+            self.evict()
+
+    def evict(self, max_bytes=None):
+        """
+        Remove least recently used entries, until the cache fits its budget
+        (or `max_bytes`, if given).
+        """
+        if max_bytes is None:
+            max_bytes = self.max_bytes
+        with self._lock:
+            entries = sorted(self._entries(), key=lambda x: x[1])
+            self._nbytes = sum(size for _, _, size in entries)
+            for entry, _, size in entries:
+                if self._nbytes <= max_bytes:
+                    break
+                try:
+                    os.remove(entry)
+                except FileNotFoundError:
+                    pass
+                self._nbytes -= size
+
+    def clear(self):
+        self.evict(0)
+
+
+class MemoryCache:
+    """
+    In-process cache of loaded data (e.g. the measurements of an instrument
+    for a single day), with a budget of `max_bytes`. Once the cache grows
+    beyond it, least recently used entries are evicted.
+    """
+    def __init__(self, max_bytes=1 << 28):
+        self.max_bytes = max_bytes
+        self.hits = self.misses = 0
+        self.nbytes = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """
+        :return: the value cached under `key`, or None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                instrumentation.count('memory_cache_misses')
+                return None
+            self.hits += 1
+            instrumentation.count('memory_cache_hits')
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, nbytes):
+        """
+        Cache `value`, of size `nbytes`. Values larger than the whole budget
+        are not cached.
+        """
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.nbytes -= old[1]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, size) = self._entries.popitem(last=False)
+                self.nbytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
@@ -0,0 +1,137 @@
+"""
+Compact (array-backed) storage of site measurements.
+"""
+import numpy as np
+import pandas as pd
+from .site_measurements import SiteMeasurements
+
+
+_spectral_tables = ['sr', 'sr_errs', 'toa', 'toa_errs']
+
+
+class CompactSiteMeasurements(SiteMeasurements):
+    """
+    Measurements whose spectral tables (sr, sr_errs, toa, toa_errs) are kept
+    in a single array of shape (4, N times, N wavelengths), float32 by
+    default, sharing one time index and one wavelength axis.
+    `present` marks, per table, the rows that were actually measured
+    (e.g. `toa` rows are missing for days without an `.output` file).
+    The spectral DataFrames are built lazily, as views when possible.
+    """
+    def __init__(self, weather, weather_errs, times, wavelengths,
+                 values, present, meta):
+        self.weather, self.weather_errs = weather, weather_errs
+        self.times, self.wavelengths = times, wavelengths
+        self.values, self.present = values, present
+        self.meta = meta
+        self._frames = {}
+
+    @classmethod
+    def from_measurements(cls, sm, dtype=np.float32, keep='last'):
+        """
+        Convert `SiteMeasurements`.
+        :param keep: 'first' or 'last', the row kept from spectral rows
+            sharing a timestamp (see `SiteMeasurements.concat`)
+        """
+        assert keep in {'first', 'last'}, 'Invalid keep: ' + str(keep)
+        tables = [getattr(sm, key) for key in _spectral_tables]
+        tables = [df[~df.index.duplicated(keep=keep)] if df.index.has_duplicates else df
+                  for df in tables]
+        times = np.unique(np.concatenate(
+            [df.index.values.astype('datetime64[ns]') for df in tables]))
+        wavelengths = np.array(next((df.columns for df in tables if len(df)), sm.sr.columns),
+                               dtype=int)
+        values = np.full((len(tables), len(times), len(wavelengths)), np.nan, dtype)
+        present = np.zeros((len(tables), len(times)), dtype=bool)
+        for i, df in enumerate(tables):
+            if len(df):
+                assert np.array_equal(df.columns, wavelengths), 'Wavelengths not matching'
+                rows = np.searchsorted(times, df.index.values.astype('datetime64[ns]'))
+                values[i, rows] = df.values
+                present[i, rows] = True
+        return cls(sm.weather, sm.weather_errs, times, wavelengths,
+                   values, present, dict(sm.meta))
+
+    @classmethod
+    def _from_parsed(cls, handles, parsed, meta, skip_empty=False,
+                     tables=None, weather=None, wavelengths=None):
+        sm = SiteMeasurements._from_parsed(handles, parsed, meta, skip_empty,
+                                           tables, weather, wavelengths)
+        return cls.from_measurements(sm)
+
+    @classmethod
+    def concat(cls, items, keep=None):
+        dtypes = [item.values.dtype for item in items if isinstance(item, cls)]
+        return cls.from_measurements(SiteMeasurements.concat(items, keep),
+                                     dtypes[0] if dtypes else np.float32, keep or 'last')
+
+    def compact(self, dtype=np.float32):
+        if self.values.dtype == dtype:
+            return self
+        return super().compact(dtype)
+
+    def resample(self, freq, how='mean', origin=None, correlated=False):
+        sm, counts = super().resample(freq, how, origin, correlated)
+        return type(self).from_measurements(sm, self.values.dtype), counts
+
+    def interpolate_to(self, times, max_gap=None, correlated=False):
+        sm = super().interpolate_to(times, max_gap, correlated)
+        return type(self).from_measurements(sm, self.values.dtype)
+
+    def to_measurements(self):
+        """
+        :return: plain `SiteMeasurements`, with the same tables
+        """
+        return SiteMeasurements(self.weather, self.weather_errs,
+                                self.sr, self.sr_errs, self.toa, self.toa_errs,
+                                dict(self.meta))
+
+    def array(self, key):
+        """
+        Values of a spectral table, as a (zero-copy) view of shape
+        (N times, N wavelengths) over the shared time index `times`.
+        Rows that are not `present` hold NaN.
+        """
+        return self.values[_spectral_tables.index(key)]
+
+    def _frame(self, key):
+        if key not in self._frames:
+            i = _spectral_tables.index(key)
+            mask = self.present[i]
+            values, times = self.values[i], self.times
+            if not mask.all():
+                values, times = values[mask], times[mask]
+            self._frames[key] = pd.DataFrame(
+                values, index=pd.DatetimeIndex(times), columns=self.wavelengths,
+                copy=False)
+        return self._frames[key]
+
+    sr = property(lambda self: self._frame('sr'))
+    sr_errs = property(lambda self: self._frame('sr_errs'))
+    toa = property(lambda self: self._frame('toa'))
+    toa_errs = property(lambda self: self._frame('toa_errs'))
+
+    def __getitem__(self, key):
+        """
+        Take a time slice (the arrays of the result are views). Other keys
+        select plain `SiteMeasurements` (see `to_measurements`).
+        """
+        if not isinstance(key, slice) or key.step is not None:
+            return self.to_measurements()[key]
+        sind = (0 if key.start is None else np.searchsorted(
+            self.times, np.datetime64(key.start, 'ns'), side='left'))
+        eind = (len(self.times) if key.stop is None else np.searchsorted(
+            self.times, np.datetime64(key.stop, 'ns'), side='right'))
+        return type(self)(self.weather.loc[key], self.weather_errs.loc[key],
+                          self.times[sind:eind], self.wavelengths,
+                          self.values[:, sind:eind], self.present[:, sind:eind],
+                          dict(self.meta))
+
+    def __add__(self, other):
+        return type(self).concat([self, other])
+
+    def memory_usage(self):
+        return (self.values.nbytes + self.present.nbytes + self.times.nbytes +
+                self.wavelengths.nbytes +
+                int(self.weather.memory_usage(deep=True).sum()) +
+                int(self.weather_errs.memory_usage(deep=True).sum()))
@@ -0,0 +1,163 @@
+"""
+Access to daily files stored in containers, without extracting them:
+members of zip and tar archives (possibly compressed), addressed as
+`ARCHIVE::MEMBER`, and gzip-compressed files (`*.gz`, also as members).
+"""
+import os
+import gzip
+import zipfile
+import tarfile
+import threading
+import collections
+
+member_sep = '::'
+# encoding of the daily files, wherever they are stored
+encoding = 'utf-8'
+_zip_suffixes = ('.zip',)
+_tar_suffixes = ('.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+
+# Archives kept open (per process), as opening an archive reads its
+# whole member list
+_max_open = 8
+_open = collections.OrderedDict()
+_lock = threading.Lock()
+
+
+def is_archive(path):
+    return path.lower().endswith(_zip_suffixes + _tar_suffixes)
+
+
+def split(path):
+    """
+    :return: archive path, member name (None if `path` is not a member)
+    """
+    archive, sep, member = path.partition(member_sep)
+    return (archive, member) if sep else (path, None)
+
+
+def join(path, name):
+    """
+    Path of `name` in the directory or archive `path`
+    """
+    if is_archive(path):
+        return path + member_sep + name
+    return os.path.join(path, name)
+
+
+def basename(path):
+    return os.path.basename(split(path)[1] or path)
+
+
+def stat(path):
+    """
+    `os.stat` of a file, or of the archive holding a member
+    """
+    return os.stat(split(path)[0])
+
+
+class _Archive:
+    """
+    Open zip or tar archive, with an index of its members.
+    Reads are serialized, as members are read from a single file object.
+    Members of compressed tar archives are best read in member order: the
+    archive is a single compressed stream, so reading a member before the
+    previous one decompresses the archive again from the start.
+    A closed archive is opened again by the next read.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._open()
+        if self._zip is not None:
+            self.names = [info.filename for info in self._zip.infolist() if not info.is_dir()]
+        else:
+            # for compressed archives, this decompresses the archive once
+            self._members = {info.name: info for info in self._tar.getmembers() if info.isfile()}
+            self.names = list(self._members)
+
+    def _open(self):
+        if self.path.lower().endswith(_zip_suffixes):
+            self._zip, self._tar = zipfile.ZipFile(self.path), None
+        else:
+            self._zip, self._tar = None, tarfile.open(self.path, 'r:*')
+
+    def read(self, name):
+        with self.lock:
+            if self._zip is None and self._tar is None:
+                self._open()
+            if self._zip is not None:
+                return self._zip.read(name)
+            return self._tar.extractfile(self._members[name]).read()
+
+    def close(self):
+        with self.lock:
+            for f in [self._zip, self._tar]:
+                if f is not None:
+                    f.close()
+            self._zip = self._tar = None
+
+
+def _archive(path):
+    """
+    :return: the open `_Archive` of `path`, opened again if the file changed
+    """
+    st = os.stat(path)
+    key = (os.getpid(), os.path.abspath(path))
+    with _lock:
+        entry = _open.get(key)
+        if entry is not None and entry[0] == (st.st_size, st.st_mtime_ns):
+            _open.move_to_end(key)
+            return entry[1]
+    archive = _Archive(path)
+    closed = []
+    with _lock:
+        if key in _open:
+            closed.append(_open[key][1])
+        _open[key] = ((st.st_size, st.st_mtime_ns), archive)
+        _open.move_to_end(key)
+        while len(_open) > _max_open:
+            closed.append(_open.popitem(last=False)[1][1])
+    # archives still used by other threads are opened again on their next read
+    for evicted in closed:
+        evicted.close()
+    return archive
+
+
+def list_files(path):
+    """
+    Names of the files in the directory or archive `path`, relative to it.
+    The members of the archives in a directory are listed as
+    `ARCHIVE::MEMBER`.
+    :return: list of names, list of the archives in the directory
+    """
+    if is_archive(path):
+        return list(_archive(path).names), []
+    names, archives = [], []
+    for name in os.listdir(path):
+        if is_archive(name):
+            archives.append(name)
+            names.extend(name + member_sep + member
+                         for member in _archive(os.path.join(path, name)).names)
+        else:
+            names.append(name)
+    return names, archives
+
+
+def read_text(path):
+    """
+    Read the whole text of a file, member of an archive, or gzip-compressed
+    file (or member), decoded from `encoding`
+    """
+    archive, member = split(path)
+    if member is None and not path.endswith('.gz'):
+        with open(path, 'rt', encoding=encoding) as f:
+            return f.read()
+    if member is None:
+        with open(path, 'rb') as f:
+            data = f.read()
+    else:
+        data = _archive(archive).read(member)
+    if path.endswith('.gz'):
+        data = gzip.decompress(data)
+    # universal newlines, as text files opened with `open`
+    return data.decode(encoding).replace('\r\n', '\n').replace('\r', '\n')
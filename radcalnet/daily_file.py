@@ -1,9 +1,15 @@
 """
 Parse the daily file format.
-The main function provided by this module is `read_daily_file`.
+The main functions provided by this module are `read_daily_arrays`
+(fast, returns NumPy arrays) and `read_daily_file` (returns native types).
 However lower-level functions are available for possible reuse in the future.
 """
+import re
+import numbers
+import collections
 import datetime as dt
+import numpy as np
+from . import instrumentation, containers
 
 
 aerosol_types = {'R': '?', 'C': '?', 'D': 'Desert',
@@ -101,12 +107,167 @@ def parse_errors_data_block(block):
     return weather_errs, srf_errs
 
 
+# Vectorized parsing into NumPy arrays
+
+DailyArrays = collections.namedtuple('DailyArrays', [
+    'metadata', 'times', 'weather_keys', 'weather', 'types',
+    'weather_errs', 'wavelengths', 'srf', 'srf_errs', 'missing'],
+    defaults=[None])
+DailyArrays.__doc__ = """
+Contents of a daily file, as NumPy arrays.
+`times` is a datetime64[ns] array of UTC timestamps, of length N.
+`weather`, `weather_errs` are float64 arrays of shape (N, len(weather_keys)),
+`types` holds the aerosol type codes, and `srf`, `srf_errs` are float64
+arrays of shape (N, len(wavelengths)), where `wavelengths` is an int array.
+`missing` is None as parsed; once fill values are masked, it is a dict
+holding the number of missing values in each column of the numeric arrays.
+"""
+
+_blank_line_re = re.compile(r'\n\s*\n')
+
+
+def _split_lines(lines, last_header):
+    """
+    Split off the leading lines of `lines`, up to the line starting with
+    `last_header` (inclusive).
+    :return: (headers, values) of the leading lines, remaining lines
+    """
+    heads, vals = [], []
+    for i, line in enumerate(lines):
+        head, _, rest = line.partition('\t')
+        heads.append(head.rstrip(':'))
+        vals.append(rest)
+        if heads[-1] == last_header:
+            return heads, vals, lines[i+1:]
+    raise AssertionError('Missing header: ' + last_header)
+
+
+def _to_matrix(rows, dtype=np.float64):
+    """
+    Convert tab-separated rows of values into a 2D array (one row per line).
+    """
+    if not any(row.strip() for row in rows):  # files without any sample
+        return np.empty((len(rows), 0), dtype)
+    return np.loadtxt(rows, dtype=dtype, ndmin=2)
+
+
+def _parse_times(heads, vals):
+    rows = dict(zip(heads, vals))
+    years = np.array(rows['Year'].split(), dtype=np.int64)
+    doys = np.array(rows['DOY(U)'].split(), dtype=np.int64)
+    hm = _to_matrix([rows['UTC'].replace(':', ' ')], np.int64).reshape(-1, 2)
+    assert len(years) == len(doys) == len(hm), 'Inconsistent time rows'
+    times = ((years - 1970).astype('datetime64[Y]').astype('datetime64[D]') +
+             (doys - 1).astype('timedelta64[D]') +
+             hm[:, 0].astype('timedelta64[h]') +
+             hm[:, 1].astype('timedelta64[m]'))
+    return times.astype('datetime64[ns]')
+
+
+def _as_wavelengths(wavelengths):
+    """
+    :return: list of `wavelengths` (in nm) as ints, as in the files
+        (e.g. 500.0 is 500, while 500.5 is rejected)
+    """
+    wavelengths = list(wavelengths)
+    for wv in wavelengths:
+        assert isinstance(wv, numbers.Real) and int(wv) == wv, 'Invalid wavelength: ' + repr(wv)
+    return [int(wv) for wv in wavelengths]
+
+
+def _parse_srf(lines, ntimes, wavelengths=None):
+    """
+    :param wavelengths: optional subset of the wavelengths to convert
+        (the lines of other wavelengths are skipped)
+    :return: wavelengths, values of shape (N times, N wavelengths)
+    """
+    if wavelengths is not None:
+        labels = {str(wv) for wv in _as_wavelengths(wavelengths)}
+        lines = [line for line in lines if line.partition('\t')[0].strip() in labels]
+        if not lines:
+            return np.empty(0, dtype=int), np.empty((ntimes, 0))
+    matrix = _to_matrix(lines)
+    wavelengths = matrix[:, 0].astype(int)
+    return wavelengths, np.ascontiguousarray(matrix[:, 1:].T)
+
+
+def _parse_weather(keys, vals, ntimes, weather=None):
+    """
+    :param weather: optional subset of the weather keys to convert
+    :return: keys, values of shape (N times, N keys)
+    """
+    if weather is not None:
+        rows = [(key, val) for key, val in zip(keys, vals) if key in weather]
+        if not rows:
+            return [], np.empty((ntimes, 0))
+        keys, vals = zip(*rows)
+    return list(keys), np.ascontiguousarray(_to_matrix(vals).T)
+
+
+def read_daily_arrays(f, wavelengths=None, weather=None):
+    """
+    Parse a daily data text file (`.input` or `.output`) into NumPy arrays.
+    `f` may be either a file-like object or a local path to such file
+    (possibly gzip-compressed, or an archive member, see `containers`).
+    Values are converted in bulk, rather than one at a time.
+    :param wavelengths: optional subset of the wavelengths to read
+        (e.g. `[]` to skip the spectral data)
+    :param weather: optional subset of the weather keys to read
+
+    :return: a `DailyArrays` tuple
+    """
+    with instrumentation.stage('read'):
+        if isinstance(f, str):
+            text = containers.read_text(f)
+        else:
+            text = f.read()
+    instrumentation.count('files_read')
+    instrumentation.count('chars_read', len(text))
+    with instrumentation.stage('parse'):
+        arrays = _parse_daily_text(text, wavelengths, weather)
+    instrumentation.count('rows_parsed', len(arrays.times))
+    return arrays
+
+
+def _parse_daily_text(text, wavelengths=None, weather=None):
+    blocks = [block.splitlines()
+              for block in _blank_line_re.split(text.strip())]
+    assert len(blocks) >= 3, 'Missing data blocks'
+
+    metadata = parse_metadata_block(
+        [line.rstrip().split('\t') for line in blocks[0]])
+
+    heads, vals, lines = _split_lines(blocks[1], 'Local')
+    times = _parse_times(heads, vals)
+    all_keys, vals, lines = _split_lines(lines, 'Ang')
+    weather_keys, weather_values = _parse_weather(all_keys, vals, len(times), weather)
+    head, _, rest = lines[0].partition('\t')
+    assert head == 'Type:', 'Unexpected header, ' + head
+    types = np.array(rest.split())
+    srf_wavelengths, srf = _parse_srf(lines[1:], len(times), wavelengths)
+
+    err_keys, vals, lines = _split_lines(blocks[2], 'Ang')
+    assert err_keys == all_keys, 'Unexpected error headers'
+    _, weather_errs = _parse_weather(err_keys, vals, len(times), weather)
+    err_wavelengths, srf_errs = _parse_srf(lines, len(times), wavelengths)
+    assert np.array_equal(srf_wavelengths, err_wavelengths), \
+        'Unexpected error wavelengths'
+
+    for val in np.unique(types):
+        assert val in aerosol_types, 'Unexpected Aerosol type: ' + val
+    assert (weather_values.shape[0] == len(types) == srf.shape[0] ==
+            weather_errs.shape[0] == srf_errs.shape[0] == len(times)), \
+        'Inconsistent number of values in rows'
+    return DailyArrays(metadata, times, weather_keys, weather_values, types,
+                       weather_errs, srf_wavelengths, srf, srf_errs)
+
+
 def read_daily_file(f):
     """
     Parse a daily data text file (`.input` or `.output`)
     `f` may be either a file-like object or a local path to such file.
     Results are returned in dicts, with values converted to proper native types
-    (int, float, datetime).
+    (int, float, datetime). This is a thin adapter over `read_daily_arrays`.
 
     :return: metadata, times, weather, weather_errs, srf, srf_errs
         where `metadata` is a dict of scalar values,
@@ -114,11 +275,12 @@ def read_daily_file(f):
         and the rest are dicts, whose values are lists with a fixed length
         (`==len(times)`).
     """
-    if isinstance(f, str):
-        f = open(f, 'rt')
-    blockiter = iter(block_iter(f))
-
-    metadata = parse_metadata_block(next(blockiter))
-    times, weather, srf = parse_main_data_block(next(blockiter))
-    weather_errs, srf_errs = parse_errors_data_block(next(blockiter))
-    return metadata, times, weather, weather_errs, srf, srf_errs
+    arrays = read_daily_arrays(f)
+    times = arrays.times.astype('datetime64[us]').tolist()
+    weather = dict(zip(arrays.weather_keys, arrays.weather.T.tolist()))
+    weather['Type'] = arrays.types.tolist()
+    weather_errs = dict(zip(arrays.weather_keys, arrays.weather_errs.T.tolist()))
+    wavelengths = arrays.wavelengths.tolist()
+    srf = dict(zip(wavelengths, arrays.srf.T.tolist()))
+    srf_errs = dict(zip(wavelengths, arrays.srf_errs.T.tolist()))
+    return arrays.metadata, times, weather, weather_errs, srf, srf_errs
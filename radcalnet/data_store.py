@@ -1,21 +1,119 @@
 import os
+import json
+import time
+import functools
+import itertools
+import datetime as dt
 import numpy as np
-from .file_handle import DailyFileHandle
-from .site_measurements import SiteMeasurements
+from . import instrumentation, containers
+from .file_handle import DailyFileHandle, filename_re
+from .loading import (
+    _select_handles, _read_dailyfile, _map_ordered, _as_timedelta,
+    _filehandle_key, _plan_reads, _read_item)
+
+
+# Directory mtimes more recent than this (relative to the scan) are not
+# trusted, in case of coarse filesystem timestamps
+_mtime_slack_ns = 2 * 10**9
 
 
 class DayfileIndex:
-    def __init__(self, path):
+    """
+    Index of the daily files in a site directory, sorted by date.
+    The directory may hold archives of daily files, or `path` may be an
+    archive (see `containers`), in which case only the files of `site` are
+    indexed.
+    The index is updated incrementally by `refresh()`.
+    """
+    def __init__(self, path, handles=None, mtime_ns=None, site=None):
         self.path = path
-        handles = [DailyFileHandle(os.path.join(path, fname))
-                   for fname in os.listdir(path)]
+        self.site = site
+        self.mtime_ns = mtime_ns
+        self._by_name = {self._name(handle.path): handle
+                         for handle in handles or []}
+        self._archives = {containers.split(name)[0] for name in self._by_name
+                          if containers.member_sep in name}
+        self._sort()
+        if handles is None:
+            self.refresh()
+
+    @classmethod
+    def from_snapshot(cls, path, snapshot, site=None):
+        handles = [DailyFileHandle.from_snapshot(path, fields)
+                   for fields in snapshot['files']]
+        return cls(path, handles, snapshot['mtime_ns'], site)
+
+    def snapshot(self):
+        """
+        :return: JSON-serializable state of the index (see `from_snapshot`)
+        """
+        return dict(mtime_ns=self.mtime_ns,
+                    files=[[self._name(handle.path)] + handle.snapshot()[1:]
+                           for handle in self.handles])
+
+    def _name(self, path):
+        """
+        Name of a file, relative to the directory (or archive)
+        """
+        return path[len(containers.join(self.path, '')):]
+
+    def _match(self, name):
+        match = filename_re.match(containers.basename(name))
+        return match is not None and (self.site is None or
+                                      match.group('instrument')[:4] == self.site)
+
+    def _mtime_ns(self):
+        """
+        Latest modification time of the directory (or archive) and of the
+        archives it holds, or None if one of them was removed
+        """
+        paths = [self.path] + [os.path.join(self.path, name) for name in sorted(self._archives)]
+        try:
+            return max(os.stat(path).st_mtime_ns for path in paths)
+        except FileNotFoundError:
+            return None
+
+    def _sort(self):
+        handles = [self._by_name[fname] for fname in sorted(self._by_name)]
         self.handles = sorted(handles, key=lambda x: x.date)
         self.datestamps = np.array(
-            [np.datetime64(x.date.date()) for x in self.handles])
+            [np.datetime64(x.date.date()) for x in self.handles],
+            dtype='datetime64[D]')
+
+    def refresh(self):
+        """
+        Update the index with files added to or removed from the directory
+        since the last scan. The directory is not listed again if its
+        modification time did not change.
+        :return: True if the index changed
+        """
+        mtime_ns = self._mtime_ns()
+        if mtime_ns is not None and mtime_ns == self.mtime_ns:
+            return False
+        scan_ns = time.time_ns()
+        with instrumentation.stage('list_dir'):
+            names, archives = containers.list_files(self.path)
+            fnames = {fname for fname in names if self._match(fname)}
+        instrumentation.count('dirs_listed')
+        self._archives = set(archives)
+        added = fnames.difference(self._by_name)
+        removed = set(self._by_name).difference(fnames)
+        for fname in removed:
+            del self._by_name[fname]
+        for fname in added:
+            self._by_name[fname] = DailyFileHandle(containers.join(self.path, fname))
+        if mtime_ns is None or scan_ns - mtime_ns <= _mtime_slack_ns:
+            mtime_ns = None
+        self.mtime_ns = mtime_ns
+        if added or removed:
+            self._sort()
+        return bool(added or removed)
 
     def __getitem__(self, key):
         assert isinstance(key, slice)
         assert key.step is None
+        if not self.handles:
+            return []
         start = (np.datetime64(key.start.date()) if key.start is not None
                  else self.datestamps[0] - np.timedelta64(1, 'D'))
         stop = (np.datetime64(key.stop.date()) if key.stop is not None
@@ -25,22 +123,280 @@ class DayfileIndex:
         return [handle.path for handle in self.handles[sind:eind]]
 
 
+class _SiteIndexes(dict):
+    """
+    Dict of site -> `DayfileIndex`, built when first accessed
+    (from the store's index snapshot, if available).
+    """
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+
+    def __missing__(self, site):
+        path = self.store.site_dirs[site]
+        # all sites of an archive share it
+        archive_site = site if containers.is_archive(path) else None
+        snapshot = self.store._snapshot.get(site)
+        if snapshot is None:
+            index = DayfileIndex(path, site=archive_site)
+        else:
+            index = DayfileIndex.from_snapshot(path, snapshot, archive_site)
+            index.refresh()
+        self[site] = index
+        return index
+
+
 class DataStore:
-    def __init__(self, path):
+    """
+    Index of a directory tree of daily files, with a sub-directory per site.
+    Site directories may hold archives of daily files, and `path` may be an
+    archive itself, whose daily files are indexed by site (see `containers`).
+    Site indexes are built lazily, and updated by `refresh()`.
+    :param cache: optional `FileCache`, to avoid parsing files repeatedly
+    :param index_path: optional path of a JSON snapshot of the index,
+        loaded at construction and saved on `refresh()`
+    :param memory_cache: optional `MemoryCache`, holding the measurements
+        of recently loaded days, so overlapping queries only load the days
+        not cached yet
+    """
+    def __init__(self, path, cache=None, index_path=None, memory_cache=None):
         self.path = path
+        self.cache = cache
+        self.memory_cache = memory_cache
+        self.index_path = index_path
+        self._snapshot = {}
+        if index_path is not None and os.path.exists(index_path):
+            with open(index_path, 'rt') as f:
+                self._snapshot = json.load(f)
         self._build_index()
 
-    def _build_index(self):
-        self.site_dirs = {
+    def _list_sites(self):
+        if containers.is_archive(self.path):
+            names, _ = containers.list_files(self.path)
+            matches = map(filename_re.match, map(containers.basename, names))
+            return {match.group('instrument')[:4]: self.path
+                    for match in matches if match is not None}
+        return {
             name: os.path.join(self.path, name)
             for name in os.listdir(self.path)
-        }
-        self.site_index = {
-            name: DayfileIndex(path)
-            for name, path in self.site_dirs.items()
+            if os.path.isdir(os.path.join(self.path, name))
         }
 
-    def get_measuremets(self, site, fromtime=None, totime=None):
+    def _build_index(self):
+        self.site_dirs = self._list_sites()
+        self.site_index = _SiteIndexes(self)
+
+    def refresh(self):
+        """
+        Pick up site directories and daily files added or removed since the
+        last scan (only sites that were already accessed are rescanned).
+        :return: list of sites whose index changed
+        """
+        site_dirs = self._list_sites()
+        changed = sorted(set(site_dirs).symmetric_difference(self.site_dirs))
+        for site in set(self.site_index).difference(site_dirs):
+            del self.site_index[site]
+        self.site_dirs = site_dirs
+        changed.extend(site for site, index in sorted(self.site_index.items())
+                       if index.refresh())
+        if self.index_path is not None:
+            self.save_index()
+        return changed
+
+    def save_index(self, path=None):
+        """
+        Save a snapshot of the (accessed) site indexes to `path`
+        (default: `index_path`)
+        """
+        path = self.index_path if path is None else path
+        snapshot = {site: entry for site, entry in self._snapshot.items()
+                    if site in self.site_dirs}
+        snapshot.update((site, index.snapshot())
+                        for site, index in self.site_index.items())
+        tmp = path + '.tmp'
+        with open(tmp, 'wt') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp, path)
+        self._snapshot = snapshot
+
+    def get_measuremets(self, site, fromtime=None, totime=None,
+                        executor=None, workers=None, compact=False,
+                        skip_empty=False, tables=None, wavelengths=None,
+                        weather=None):
+        """
+        Load the measurements of `site` in the given time range.
+        Files may be parsed in parallel, using `executor` or a pool of
+        `workers` processes (see `SiteMeasurements.from_pathlist`).
+        :param compact: if True, return `CompactSiteMeasurements`
+        :param skip_empty: if True, leave out files without any valid
+            spectral value (see `missing_summary`)
+        :param tables, wavelengths, weather: optional subsets of the tables,
+            wavelengths and weather columns to load
+            (see `SiteMeasurements.from_pathlist`)
+        """
+        projection = dict(tables=tables, wavelengths=wavelengths, weather=weather)
+        from .site_measurements import SiteMeasurements
+        from .compact import CompactSiteMeasurements
+        with instrumentation.stage('get_measurements'):
+            paths = self.site_index[site][fromtime:totime]
+            if self.memory_cache is not None:
+                sm = self._load_days(paths, executor, workers, skip_empty, **projection)
+                return (sm.compact() if compact else sm)[fromtime:totime]
+            cls = CompactSiteMeasurements if compact else SiteMeasurements
+            sm = cls.from_pathlist(paths, cache=self.cache, executor=executor,
+                                   workers=workers, skip_empty=skip_empty, **projection)
+            return sm[fromtime:totime]
+
+    def _load_days(self, paths, executor=None, workers=None, skip_empty=False,
+                   tables=None, wavelengths=None, weather=None):
+        """
+        Load the measurements of the daily files `paths`, taking the days
+        held in `memory_cache`, and parsing the files of the other days
+        (which are then cached).
+        Days are keyed by instrument, date and file names (and the loading
+        options), so days whose files were updated to a new version are
+        loaded again.
+        """
+        from .site_measurements import SiteMeasurements
+        meta, handles = _select_handles(paths)
+        options = (skip_empty,) + tuple(None if arg is None else tuple(arg)
+                                        for arg in [tables, wavelengths, weather])
+        days = []
+        for (instrument, date), day_handles in itertools.groupby(handles, _filehandle_key):
+            day_handles, items = _plan_reads(list(day_handles), tables, wavelengths)
+            key = (instrument, date, tuple(path for path, _ in items)) + options
+            days.append([key, day_handles, items, self.memory_cache.get(key)])
+
+        missing = [item for _, _, items, sm in days if sm is None for item in items]
+        parsed = dict(zip([path for path, _ in missing], _map_ordered(
+            functools.partial(_read_item, weather=weather),
+            missing, executor, workers, self.cache)))
+        for day in days:
+            key, day_handles, items, sm = day
+            if sm is None:
+                sm = SiteMeasurements._from_parsed(
+                    day_handles, [parsed[path] for path, _ in items],
+                    dict(meta), skip_empty, tables, weather, wavelengths)
+                self.memory_cache.put(key, sm, sm.memory_usage())
+                day[3] = sm
+        # without any day, the empty tables still get the projected columns
+        return SiteMeasurements._from_parts(
+            [sm for _, _, _, sm in days] or
+            [SiteMeasurements._from_parsed([], [], dict(meta), skip_empty, tables,
+                                           weather, wavelengths)], meta)
+
+    def missing_summary(self, site, fromtime=None, totime=None):
+        """
+        Data quality summary of the daily files of `site` in the given time
+        range (by date, as the files to load for the same range).
+        :return: frame indexed by file name, with the number of rows of each
+            file ('rows', 'all'), and the number of missing values in each
+            column of its arrays (e.g. ('weather', 'AOD'), ('srf', 400))
+        """
+        import pandas as pd
         paths = self.site_index[site][fromtime:totime]
-        sm = SiteMeasurements.from_pathlist(paths)
-        return sm[fromtime:totime]
+        rows = []
+        for path in paths:
+            arrays = _read_dailyfile(path, self.cache)
+            counts = {('rows', 'all'): len(arrays.times)}
+            for key, columns in [('weather', arrays.weather_keys),
+                                 ('weather_errs', arrays.weather_keys),
+                                 ('srf', arrays.wavelengths.tolist()),
+                                 ('srf_errs', arrays.wavelengths.tolist())]:
+                counts.update(((key, col), n) for col, n in zip(columns, arrays.missing[key]))
+            rows.append(pd.Series(counts))
+        return pd.DataFrame(rows, index=[containers.basename(path) for path in paths])
+
+    def get_batch(self, queries, executor=None, workers=None):
+        """
+        Load the measurements of several queries at once. Each query is a
+        site code (e.g. 'BTCN') or an instrument code (e.g. 'BTCN02'),
+        optionally with a time range: `(code, fromtime, totime)`.
+        The files needed by all queries are parsed together, in a single
+        (possibly parallel, see `get_measuremets`) pass, and files shared by
+        several queries are parsed only once.
+        :return: dict of query -> `SiteMeasurements`, where time range
+            queries are keyed as tuples (see `combine_batch` to merge them
+            into a single frame)
+        """
+        plans = {}
+        for query in queries:
+            query = query if isinstance(query, str) else tuple(query)
+            code, fromtime, totime = ((query, None, None) if isinstance(query, str)
+                                      else query)
+            instrument = code if len(code) > 4 else None
+            paths = self.site_index[code[:4]][fromtime:totime]
+            plans[query] = (slice(fromtime, totime),
+                            _select_handles(paths, instrument))
+
+        paths = sorted({handle.path for _, (_, handles) in plans.values()
+                        for handle in handles})
+        parsed = dict(zip(paths, _map_ordered(
+            _read_dailyfile, paths, executor, workers, self.cache)))
+
+        from .site_measurements import SiteMeasurements
+        results = {}
+        for query, (window, (meta, handles)) in plans.items():
+            sm = SiteMeasurements._from_parsed(
+                handles, [parsed[handle.path] for handle in handles], meta)
+            results[query] = sm[window]
+        return results
+
+    def iter_measurements(self, site, fromtime=None, totime=None, chunk='30D',
+                          executor=None, workers=None):
+        """
+        Iterate over the measurements of `site` in the given time range, in
+        time order, as `SiteMeasurements` chunks. Each chunk covers a `chunk`
+        long interval (a `timedelta`, or a string such as '30D' or '12h'),
+        so only the files of a single chunk are loaded at a time.
+        Files are loaded by whole days, and each one only once: chunks
+        shorter than a day are sliced from the days loaded for the first one.
+        Chunks without any measurements are skipped.
+        """
+        from .site_measurements import SiteMeasurements
+        index = self.site_index[site]
+        if not index.handles:
+            return
+        chunk = _as_timedelta(chunk)
+        assert chunk > dt.timedelta(0), 'Empty chunks'
+        epsilon = dt.timedelta(microseconds=1)
+        if fromtime is None:
+            fromtime = dt.datetime.combine(index.handles[0].date.date(), dt.time())
+        if totime is None:
+            totime = dt.datetime.combine(index.handles[-1].date.date(), dt.time()) \
+                + dt.timedelta(days=1) - epsilon
+        loaded, loaded_stop = None, None
+        start = fromtime
+        while start <= totime:
+            stop = min(start + chunk - epsilon, totime)
+            if index[start:stop]:
+                if loaded is None or stop > loaded_stop:
+                    # load up to the end of the last day of the chunk, keeping
+                    # the rows already loaded after the start of the chunk
+                    load_from = start if loaded is None else max(start, loaded_stop + epsilon)
+                    day_end = dt.datetime.combine(stop.date(), dt.time()) \
+                        + dt.timedelta(days=1) - epsilon
+                    new = self.get_measuremets(site, load_from, min(day_end, totime),
+                                               executor, workers)
+                    loaded = new if loaded is None or loaded_stop < start else \
+                        SiteMeasurements._from_parts([loaded[start:], new], new.meta)
+                    loaded_stop = min(day_end, totime)
+                sm = loaded[start:stop]
+                if len(sm.weather):
+                    yield sm
+            start += chunk
+
+
+def combine_batch(results, table):
+    """
+    Combine one table (e.g. 'toa') of the results of `DataStore.get_batch`
+    into a single frame, indexed by (query, instrument, time), where query
+    is the position of the query in `results` (queries of the same
+    instrument are kept apart), and instrument is the code of the query for
+    empty results.
+    """
+    import pandas as pd
+    frames = [getattr(sm, table) for sm in results.values()]
+    keys = [(i, sm.meta.get('instrument', query if isinstance(query, str) else query[0]))
+            for i, (query, sm) in enumerate(results.items())]
+    return pd.concat(frames, keys=keys, names=['query', 'instrument', 'time'])
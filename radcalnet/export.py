@@ -0,0 +1,203 @@
+"""
+Export of a `DataStore` to columnar datasets (Parquet, or Arrow IPC files),
+and queries over the exported datasets.
+Each table gets a dataset directory, partitioned by site and year:
+
+    DEST/<table>/site=<site>/year=<year>/<instrument>.<parquet|arrow>
+
+with a 'time' and an 'instrument' column, and one column per weather
+variable or wavelength. Rows are sorted by time, and written in row groups
+(record batches). Time range queries only scan the partitions of the years
+in range: in Parquet files, they also skip the row groups out of range
+(using their statistics), while Arrow IPC files are scanned in full and
+filtered. Wavelength subsets read only their columns.
+
+Requires pyarrow (`pip install radcalnet[export]`).
+
+Usage: python -m radcalnet.export DATASTORE_DIR DEST_DIR [--site SITE] [--format arrow]
+"""
+import os
+import re
+import json
+import argparse
+import datetime as dt
+import numpy as np
+import pandas as pd
+from .data_store import DataStore
+from .site_measurements import SiteMeasurements, _table_columns, _empty_frame
+
+
+formats = {'parquet': 'parquet', 'arrow': 'ipc'}
+_extensions = {'parquet': '.parquet', 'arrow': '.arrow'}
+meta_name = 'meta.json'
+_year_re = re.compile(r'^year=(\d+)$')
+
+
+def _to_arrow(df, instrument):
+    import pyarrow as pa
+    columns = {'time': df.index.values.astype('datetime64[ns]'),
+               'instrument': np.full(len(df), instrument, dtype=object)}
+    columns.update((str(col), df[col].to_numpy()) for col in df.columns)
+    return pa.table(columns)
+
+
+def _write_table(table, path, fmt, row_group_size):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = path + '.tmp'
+    if fmt == 'parquet':
+        pq.write_table(table, tmp, row_group_size=row_group_size)
+    else:
+        with pa.ipc.new_file(tmp, table.schema) as writer:
+            writer.write_table(table, max_chunksize=row_group_size)
+    os.replace(tmp, path)
+
+
+def export_store(store, dest, sites=None, fmt='parquet', row_group_size=1024):
+    """
+    Export the measurements of a `DataStore`, a year of an instrument at a
+    time. Existing files of the exported instruments and years are replaced.
+    :param sites: sites to export (default: all)
+    :param fmt: 'parquet' or 'arrow'
+    :param row_group_size: number of rows per row group (or record batch)
+    :return: list of the written files
+    """
+    assert fmt in formats, 'Unsupported format: ' + fmt
+    meta_path = os.path.join(dest, meta_name)
+    instruments_meta = {}
+    if os.path.exists(meta_path):
+        with open(meta_path, 'rt') as f:
+            instruments_meta = json.load(f)
+    written = []
+    for site in sorted(store.site_dirs if sites is None else sites):
+        handles = store.site_index[site].handles
+        for instrument in sorted({handle.instrument for handle in handles}):
+            years = sorted({handle.date.year for handle in handles
+                            if handle.instrument == instrument})
+            for year in years:
+                fromtime = dt.datetime(year, 1, 1)
+                totime = dt.datetime(year + 1, 1, 1) - dt.timedelta(microseconds=1)
+                query = (instrument, fromtime, totime)
+                sm = store.get_batch([query])[query]
+                if len(sm.weather):
+                    instruments_meta[instrument] = sm.meta
+                for table in _table_columns:
+                    path = os.path.join(
+                        dest, table, 'site={}'.format(site), 'year={}'.format(year),
+                        instrument + _extensions[fmt])
+                    df = getattr(sm, table)
+                    if not len(df):
+                        if os.path.exists(path):
+                            os.remove(path)
+                        continue
+                    _write_table(_to_arrow(df, instrument), path, fmt, row_group_size)
+                    written.append(path)
+    os.makedirs(dest, exist_ok=True)
+    with open(meta_path, 'wt') as f:
+        json.dump(instruments_meta, f)
+    return written
+
+
+class ColumnarStore:
+    """
+    Queries over the datasets written by `export_store`, with the same
+    results as `DataStore.get_measuremets`. Time ranges and wavelength
+    subsets are pushed down to the dataset scan.
+    """
+    def __init__(self, path, fmt='parquet'):
+        assert fmt in formats, 'Unsupported format: ' + fmt
+        self.path, self.fmt = path, fmt
+        with open(os.path.join(path, meta_name), 'rt') as f:
+            self.meta = json.load(f)
+
+    def instruments(self, site):
+        return sorted(instrument for instrument in self.meta if instrument[:4] == site)
+
+    def _files(self, table, instrument, fromtime, totime):
+        """
+        Files of `instrument` in the partitions of the years in range
+        """
+        site_dir = os.path.join(self.path, table, 'site=' + instrument[:4])
+        if not os.path.isdir(site_dir):
+            return []
+        years = sorted(int(match.group(1)) for match in map(_year_re.match, os.listdir(site_dir))
+                       if match)
+        paths = [os.path.join(site_dir, 'year={}'.format(year), instrument + _extensions[self.fmt])
+                 for year in years
+                 if (fromtime is None or year >= fromtime.year) and
+                 (totime is None or year <= totime.year)]
+        return [path for path in paths if os.path.exists(path)]
+
+    def _read(self, table, instrument, fromtime, totime, columns):
+        """
+        Read the rows in the time range, scanning only the partitions of the
+        years in range (and for Parquet, the row groups overlapping the time
+        range)
+        """
+        import pyarrow.dataset as ds
+        paths = self._files(table, instrument, fromtime, totime)
+        if not paths:
+            return None
+        expr = None
+        if fromtime is not None:
+            expr = ds.field('time') >= pd.Timestamp(fromtime).to_datetime64()
+        if totime is not None:
+            stop = ds.field('time') <= pd.Timestamp(totime).to_datetime64()
+            expr = stop if expr is None else expr & stop
+        dataset = ds.dataset(paths, format=formats[self.fmt])
+        return dataset.to_table(columns=['time'] + columns, filter=expr)
+
+    def get_measuremets(self, site, fromtime=None, totime=None, wavelengths=None,
+                        instrument=None):
+        """
+        Load the measurements of `site` in the given time range.
+        :param wavelengths: optional subset of the wavelengths of the
+            spectral tables
+        :param instrument: instrument code (default: the first instrument of
+            the site)
+        """
+        if instrument is None:
+            instruments = self.instruments(site)
+            if not instruments:
+                return SiteMeasurements(
+                    *[_empty_frame(key) for key in _table_columns], meta={})
+            instrument = instruments[0]
+        data = {}
+        for key, columns in _table_columns.items():
+            if wavelengths is not None and key not in {'weather', 'weather_errs'}:
+                columns = [wv for wv in columns if wv in set(wavelengths)]
+            table = self._read(key, instrument, fromtime, totime, [str(col) for col in columns])
+            if table is None or table.num_rows == 0:
+                df = _empty_frame(key)[columns]
+            else:
+                index = pd.DatetimeIndex(table['time'].to_numpy().astype('datetime64[ns]'))
+                df = pd.DataFrame({col: table[str(col)].to_numpy(zero_copy_only=False)
+                                   for col in columns}, index=index)
+            data[key] = df
+        # as `DataStore`, metadata is only available when data was found
+        meta = dict(self.meta[instrument]) if any(len(df) for df in data.values()) else {}
+        return SiteMeasurements(data['weather'], data['weather_errs'],
+                                data['sr'], data['sr_errs'], data['toa'], data['toa_errs'],
+                                meta)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Export a directory of RadCalNet daily files to columnar '
+                    'datasets, partitioned by site and year')
+    parser.add_argument('datastore', help='directory with a sub-directory per site')
+    parser.add_argument('dest', help='dataset directory')
+    parser.add_argument('--site', action='append', help='site to export (default: all)')
+    parser.add_argument('--format', default='parquet', choices=sorted(formats),
+                        help='file format')
+    parser.add_argument('--row-group-size', type=int, default=1024,
+                        help='number of rows per row group')
+    args = parser.parse_args(argv)
+    written = export_store(DataStore(args.datastore), args.dest, args.site,
+                           args.format, args.row_group_size)
+    print('{} files written'.format(len(written)))
+
+
+if __name__ == '__main__':
+    main()
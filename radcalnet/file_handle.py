@@ -1,6 +1,6 @@
-import os
 import re
 import datetime as dt
+from . import instrumentation, containers
 
 site_info = {
     'RVUS': ('Railroad Valley, United States'),
@@ -30,12 +30,14 @@ class DailyFileHandle:
     Handle for site daily data file
     Contains the path to the file, as well as the parsed metadata that is
     encoded in the filename format.
+    The file may be gzip-compressed, or a member of an archive
+    (see `containers`).
     """
     date_fmt = '%Y_%j'
 
     def __init__(self, path):
         self.path = path
-        basename = os.path.basename(path)
+        basename = containers.basename(path)
         parsed = filename_re.match(basename).groupdict()
         self.instrument = parsed['instrument']
         self.site = self.instrument[:4]
@@ -47,3 +49,26 @@ class DailyFileHandle:
         self.output_version = version[1:3]
         self.input_version = version[4:6]
         self.stage = parsed['stage']
+        instrumentation.count('filenames_parsed')
+
+    def snapshot(self):
+        """
+        :return: the parsed fields, as a JSON-serializable list
+            (see `from_snapshot`)
+        """
+        return [containers.basename(self.path), self.instrument,
+                self.date.toordinal(), self.output_version,
+                self.input_version, self.stage]
+
+    @classmethod
+    def from_snapshot(cls, dirpath, fields):
+        """
+        Rebuild a handle from `snapshot()` fields, without parsing the name
+        """
+        handle = cls.__new__(cls)
+        name, handle.instrument, ordinal, handle.output_version, \
+            handle.input_version, handle.stage = fields
+        handle.path = containers.join(dirpath, name)
+        handle.site = handle.instrument[:4]
+        handle.date = dt.datetime.fromordinal(ordinal)
+        return handle
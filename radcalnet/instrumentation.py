@@ -0,0 +1,117 @@
+"""
+Opt-in instrumentation of the load path: per-stage timings and counters.
+Nothing is recorded (and the overhead is a single check per stage) unless a
+recorder is active, e.g.:
+
+    with instrumentation.record() as stats:
+        store.get_measuremets('RVUS', fromtime, totime)
+    stats.log()  # or stats.as_dict()
+
+Stages and counters are recorded from all threads. Work done in worker
+processes (`workers=` / process pool executors) is not recorded.
+"""
+import time
+import logging
+import threading
+import contextlib
+import collections
+
+
+_recorders = []
+_null_stage = contextlib.nullcontext()
+
+
+class Stats:
+    """
+    Recorder accumulating the total time and number of calls of each stage,
+    and the total of each counter.
+    """
+    def __init__(self):
+        self.times = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        self.counts = collections.defaultdict(int)
+        self._lock = threading.Lock()
+
+    def add_time(self, stage, seconds):
+        with self._lock:
+            self.times[stage] += seconds
+            self.calls[stage] += 1
+
+    def add_count(self, name, n):
+        with self._lock:
+            self.counts[name] += n
+
+    def as_dict(self):
+        with self._lock:
+            return dict(
+                stages={stage: dict(seconds=seconds, calls=self.calls[stage])
+                        for stage, seconds in self.times.items()},
+                counts=dict(self.counts))
+
+    def log(self, logger=None, level=logging.INFO):
+        logger = logger or logging.getLogger('radcalnet')
+        stats = self.as_dict()
+        for stage, info in sorted(stats['stages'].items()):
+            logger.log(level, 'stage %s: %.6fs in %d calls',
+                       stage, info['seconds'], info['calls'])
+        for name, n in sorted(stats['counts'].items()):
+            logger.log(level, 'count %s: %d', name, n)
+
+
+def register(recorder):
+    """
+    Activate a recorder: any object with `add_time(stage, seconds)` and
+    `add_count(name, n)` methods.
+    """
+    _recorders.append(recorder)
+
+
+def unregister(recorder):
+    _recorders.remove(recorder)
+
+
+@contextlib.contextmanager
+def record():
+    """
+    Record stats of the enclosed code into a new `Stats` object
+    """
+    stats = Stats()
+    register(stats)
+    try:
+        yield stats
+    finally:
+        unregister(stats)
+
+
+class _Stage:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        for recorder in list(_recorders):
+            recorder.add_time(self.name, elapsed)
+
+
+def stage(name):
+    """
+    Context manager timing the enclosed code as stage `name`
+    """
+    if not _recorders:
+        return _null_stage
+    return _Stage(name)
+
+
+def count(name, n=1):
+    """
+    Add `n` to counter `name`
+    """
+    if _recorders:
+        for recorder in list(_recorders):
+            recorder.add_count(name, n)
@@ -0,0 +1,231 @@
+"""
+Rolling site measurements, updated in place as new daily files arrive.
+"""
+import numpy as np
+import pandas as pd
+from .loading import (
+    _as_timedelta, _meta_coords, _read_dailyfile, _map_ordered, _select_handles)
+from .site_measurements import (
+    SiteMeasurements, _table_columns, _empty_frame, _dataframe_concat)
+
+
+class _TableBuffer:
+    """
+    Rows of a table, kept sorted by time in preallocated arrays, which grow
+    geometrically. Rows are appended at the end, and dropped from the start
+    (the remaining rows are moved back to the start of the arrays only once
+    the free space at the end runs out), so both cost amortized time
+    proportional to the number of rows appended.
+    """
+    def __init__(self, key):
+        self.key = key
+        self.columns = None
+        self.start = self.stop = 0
+        self._frame = None
+
+    def _allocate(self, df, capacity):
+        self.columns = list(df.columns)
+        self.numeric = [col for col in self.columns if col != 'Type']
+        self.times = np.empty(capacity, dtype='datetime64[ns]')
+        self.values = np.empty((capacity, len(self.numeric)))
+        self.types = np.empty(capacity, dtype=object) if 'Type' in self.columns else None
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def nbytes(self):
+        if self.columns is None:
+            return 0
+        return (self.times.nbytes + self.values.nbytes +
+                (0 if self.types is None else self.types.nbytes))
+
+    def frame(self):
+        """
+        :return: the rows as a DataFrame, viewing the arrays
+            (until the next update)
+        """
+        if self.columns is None:
+            return _empty_frame(self.key)
+        if self._frame is None:
+            self._frame = self._rows(self.start, self.stop, copy=False)
+        return self._frame
+
+    def _rows(self, start, stop, copy=True):
+        rows = slice(start, stop)
+        df = pd.DataFrame(self.values[rows], index=pd.DatetimeIndex(self.times[rows]),
+                          columns=self.numeric, copy=copy)
+        if self.types is not None:
+            df.insert(self.columns.index('Type'), 'Type', self.types[rows])
+        return df
+
+    def append(self, df):
+        """
+        Add the rows of `df` (sorted by time). Rows that are not earlier than
+        the first new row are merged with the new rows, with the semantics of
+        `SiteMeasurements.concat`.
+        """
+        if not len(df):
+            return
+        if self.columns is None:
+            self._allocate(df, max(len(df), 16))
+        assert list(df.columns) == self.columns, 'Columns not matching'
+        first = np.datetime64(df.index.values[0], 'ns')
+        offset = np.searchsorted(self.times[self.start:self.stop], first, side='left')
+        if offset < len(self):
+            df = _dataframe_concat([self._rows(self.start + offset, self.stop), df], self.key)
+        self._reserve(offset + len(df))
+        self._write(self.start + offset, df)
+
+    def _reserve(self, nrows):
+        """
+        Make room for `nrows` rows from `start`, moving the rows back to the
+        start of the arrays, and reallocating them twice as large if needed
+        """
+        if self.start + nrows <= len(self.times):
+            return
+        capacity = len(self.times)
+        if 2 * nrows > capacity:
+            capacity = max(2 * capacity, 2 * nrows)
+        rows = slice(self.start, self.stop)
+        arrays = [self.times, self.values] + ([] if self.types is None else [self.types])
+        for i, array in enumerate(arrays):
+            moved = np.empty((capacity,) + array.shape[1:], dtype=array.dtype) \
+                if capacity != len(array) else array
+            moved[:len(self)] = array[rows]
+            arrays[i] = moved
+        self.times, self.values = arrays[:2]
+        if self.types is not None:
+            self.types = arrays[2]
+        self.start, self.stop = 0, len(self)
+
+    def _write(self, pos, df):
+        end = pos + len(df)
+        self.times[pos:end] = df.index.values.astype('datetime64[ns]')
+        self.values[pos:end] = df[self.numeric].to_numpy(float)
+        if self.types is not None:
+            self.types[pos:end] = df['Type'].to_numpy(dtype=object)
+        self.stop = end
+        self._frame = None
+
+    def last_time(self):
+        return self.times[self.stop - 1] if len(self) else None
+
+    def drop_before(self, time):
+        dropped = int(np.searchsorted(self.times[self.start:self.stop], time, side='left')) \
+            if len(self) else 0
+        if dropped:
+            self.start += dropped
+            self._frame = None
+        return dropped
+
+
+class LiveSiteMeasurements(SiteMeasurements):
+    """
+    Rolling measurements of an instrument, updated in place as new daily
+    files arrive: `append_files` parses only the new files, and appends
+    their rows to buffers growing geometrically, so an update takes time
+    proportional to the new data, rather than to the whole window.
+    The tables are DataFrames viewing the buffers, valid until the next
+    update (see `to_measurements` for a copy).
+    :param instrument: instrument code (default: that of the first files)
+    :param retention: optional time span (timedelta, or a string such as
+        '30D'), before the latest sample, out of which rows are dropped
+    :param cache: optional `FileCache`, to parse the files through
+    """
+    def __init__(self, instrument=None, retention=None, cache=None):
+        self.meta = {} if instrument is None else dict(site=instrument[:4],
+                                                       instrument=instrument)
+        self.retention = (None if retention is None else
+                          np.timedelta64(_as_timedelta(retention), 'ns'))
+        self.cache = cache
+        self._buffers = {key: _TableBuffer(key) for key in _table_columns}
+
+    weather = property(lambda self: self._buffers['weather'].frame())
+    weather_errs = property(lambda self: self._buffers['weather_errs'].frame())
+    sr = property(lambda self: self._buffers['sr'].frame())
+    sr_errs = property(lambda self: self._buffers['sr_errs'].frame())
+    toa = property(lambda self: self._buffers['toa'].frame())
+    toa_errs = property(lambda self: self._buffers['toa_errs'].frame())
+
+    def append_files(self, paths, executor=None, workers=None):
+        """
+        Parse the daily files `paths` (of the instrument, see
+        `SiteMeasurements.from_pathlist`), and append their rows.
+        Files are expected to be mostly later than the current rows: earlier
+        files are merged in, at a cost proportional to the rows they overlap.
+        :return: number of files appended
+        """
+        meta, handles = _select_handles(paths, self.meta.get('instrument'))
+        parsed = _map_ordered(_read_dailyfile, [handle.path for handle in handles],
+                              executor, workers, self.cache)
+        self.extend(SiteMeasurements._from_parsed(handles, parsed, dict(self.meta) or meta))
+        return len(handles)
+
+    def extend(self, sm):
+        """
+        Append the rows of measurements `sm` (of the same instrument), then
+        drop the rows out of the retention span.
+        """
+        if 'instrument' in sm.meta:
+            assert sm.meta['instrument'] == self.meta.get('instrument', sm.meta['instrument']), \
+                'Instrument not matching'
+        if 'Lon' in sm.meta and 'Lon' in self.meta:
+            assert _meta_coords(sm.meta) == _meta_coords(self.meta), \
+                'Site coordinates not matching other files'
+        self.meta = dict(sm.meta, **self.meta)
+        for key, buffer in self._buffers.items():
+            buffer.append(getattr(sm, key))
+        if self.retention is not None:
+            times = [buffer.last_time() for buffer in self._buffers.values() if len(buffer)]
+            if times:
+                self.drop_before(max(times) - self.retention)
+
+    def drop_before(self, time):
+        """
+        Drop the rows earlier than `time`
+        :return: number of dropped rows, per table
+        """
+        time = np.datetime64(pd.Timestamp(time).to_datetime64(), 'ns')
+        return {key: buffer.drop_before(time) for key, buffer in self._buffers.items()}
+
+    def to_measurements(self):
+        """
+        :return: plain `SiteMeasurements`, with copies of the tables
+        """
+        return SiteMeasurements(*[getattr(self, key).copy() for key in _table_columns],
+                                dict(self.meta))
+
+    # Measurements built by the inherited constructors are plain
+    # `SiteMeasurements` (live measurements only grow through `extend`)
+    @classmethod
+    def from_pathlist(cls, *args, **kwargs):
+        return SiteMeasurements.from_pathlist(*args, **kwargs)
+
+    @classmethod
+    def _from_parsed(cls, *args, **kwargs):
+        return SiteMeasurements._from_parsed(*args, **kwargs)
+
+    @classmethod
+    def _from_parts(cls, parts, meta):
+        return SiteMeasurements._from_parts(parts, meta)
+
+    @classmethod
+    def concat(cls, items, keep=None):
+        return SiteMeasurements.concat(items, keep)
+
+    def __getitem__(self, key):
+        """
+        Take a time slice, as plain `SiteMeasurements` (copying only the
+        rows of the slice)
+        """
+        return SiteMeasurements(*[getattr(self, table).loc[key].copy() for table in _table_columns],
+                                dict(self.meta))
+
+    def __add__(self, other):
+        return SiteMeasurements.concat([self, other])
+
+    def memory_usage(self):
+        """
+        :return: memory allocated by the buffers, in bytes
+        """
+        return sum(buffer.nbytes() for buffer in self._buffers.values())
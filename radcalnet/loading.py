@@ -0,0 +1,215 @@
+"""
+Reading of daily files into (NaN-masked) arrays, shared by the data store
+and the measurement tables. This module does not depend on pandas, so the
+index and parsing layers can be imported without it.
+"""
+import os
+import re
+import itertools
+import functools
+import datetime as dt
+import concurrent.futures
+import numpy as np
+from . import instrumentation
+from .daily_file import read_daily_arrays, _as_wavelengths
+from .file_handle import DailyFileHandle
+
+
+_timedelta_re = re.compile(r'^\s*(\d+)\s*([A-Za-z]+)\s*$')
+_timedelta_units = dict(W='weeks', D='days', h='hours', H='hours',
+                        min='minutes', T='minutes', s='seconds', S='seconds')
+
+
+def _as_timedelta(value):
+    """
+    Convert a `timedelta`, `numpy.timedelta64`, or a string such as '30D',
+    '12h' or '90min', to a `timedelta`
+    """
+    if isinstance(value, dt.timedelta):
+        return value
+    if isinstance(value, np.timedelta64):
+        return value.astype('timedelta64[us]').item()
+    match = _timedelta_re.match(value)
+    assert match and match.group(2) in _timedelta_units, \
+        'Invalid time interval: ' + value
+    return dt.timedelta(**{_timedelta_units[match.group(2)]: int(match.group(1))})
+
+
+def _filehandle_key(handle):
+    return handle.instrument, handle.date.date()
+
+
+def _meta_coords(meta):
+    return tuple(meta[key] for key in ['Lon', 'Lat', 'Alt'])
+
+
+_masked_keys = ['weather', 'weather_errs', 'srf', 'srf_errs']
+_stage_tables = {'input': ('sr', 'sr_errs'), 'output': ('toa', 'toa_errs')}
+
+
+def _mask_fill_values(arrays):
+    """
+    Replace fill values (9000 and above) with NaN in the numeric arrays,
+    in place, and count the missing values of each column. A single mask is
+    computed per array, and used for both.
+    :return: `arrays`, with the `missing` counts
+    """
+    with instrumentation.stage('mask'):
+        missing = {}
+        for key in _masked_keys:
+            values = getattr(arrays, key)
+            mask = ~(values < 9000)  # fill values, and NaN
+            np.putmask(values, mask, np.nan)
+            missing[key] = np.count_nonzero(mask, axis=0)
+        return arrays._replace(missing=missing)
+
+
+def _count_missing(arrays):
+    """
+    Count the missing values of each column of already masked arrays
+    """
+    return arrays._replace(missing={
+        key: np.count_nonzero(np.isnan(getattr(arrays, key)), axis=0)
+        for key in _masked_keys})
+
+
+def _is_empty(arrays, keys=('srf',)):
+    """
+    :param keys: arrays to check, e.g. ('weather',) when only the weather
+        tables are loaded (arrays without any column are not checked)
+    :return: True if the (masked) arrays do not hold any valid value
+    """
+    missing = [arrays.missing[key] for key in keys if getattr(arrays, key).shape[1]]
+    return bool(missing) and all(np.all(counts == len(arrays.times)) for counts in missing)
+
+
+def _project(arrays, wavelengths=None, weather=None):
+    """
+    Select columns of (masked) arrays, as `read_daily_arrays` would read them
+    """
+    missing = dict(arrays.missing)
+    changes = {}
+    if wavelengths is not None:
+        cols = np.isin(arrays.wavelengths, list(wavelengths))
+        changes.update(wavelengths=arrays.wavelengths[cols],
+                       srf=arrays.srf[:, cols], srf_errs=arrays.srf_errs[:, cols])
+        missing.update((key, missing[key][cols]) for key in ['srf', 'srf_errs'])
+    if weather is not None:
+        cols = [i for i, key in enumerate(arrays.weather_keys) if key in weather]
+        changes.update(weather_keys=[arrays.weather_keys[i] for i in cols],
+                       weather=arrays.weather[:, cols],
+                       weather_errs=arrays.weather_errs[:, cols])
+        missing.update((key, missing[key][cols]) for key in ['weather', 'weather_errs'])
+    return arrays._replace(missing=missing, **changes)
+
+
+def _read_masked(path, wavelengths=None, weather=None):
+    return _mask_fill_values(read_daily_arrays(path, wavelengths, weather))
+
+
+def _read_dailyfile(path, cache=None, wavelengths=None, weather=None):
+    """
+    Read a daily file into NaN-masked arrays, through `cache` if given.
+    Only the given `wavelengths` and `weather` keys are read (or, from the
+    cache, which holds whole files, selected).
+    """
+    if cache is not None:
+        arrays = cache.get(path, _read_masked)
+        if wavelengths is None and weather is None:
+            return arrays
+        return _project(arrays, wavelengths, weather)
+    return _read_masked(path, wavelengths, weather)
+
+
+def _plan_reads(handles, tables=None, wavelengths=None):
+    """
+    Select the files needed to load `tables` (default: all tables), and the
+    wavelengths to read from each: files that are only needed for their
+    weather data are read without their spectral data.
+    :return: selected handles, list of (path, wavelengths) items
+        (see `_read_item`)
+    """
+    if wavelengths is not None:
+        wavelengths = _as_wavelengths(wavelengths)
+    if tables is None:
+        return handles, [(handle.path, wavelengths) for handle in handles]
+    with_weather = bool({'weather', 'weather_errs'}.intersection(tables))
+    selected, items = [], []
+    for handle in handles:
+        with_srf = bool(set(_stage_tables[handle.stage]).intersection(tables))
+        if with_srf or with_weather:
+            selected.append(handle)
+            items.append((handle.path, wavelengths if with_srf else []))
+    return selected, items
+
+
+def _read_item(item, cache=None, weather=None):
+    path, wavelengths = item
+    return _read_dailyfile(path, cache, wavelengths, weather)
+
+
+def _map_ordered(func, items, executor=None, workers=None, cache=None):
+    """
+    Apply `func` to each of `items`, possibly in parallel, using `executor`
+    or else a process pool of `workers` processes.
+    :param cache: optional `FileCache`, passed to `func` as `cache`: the
+        stats of the copies of `cache` used by worker processes are added
+        to those of `cache`
+    :return: list of results, in the order of `items`
+    """
+    items = list(items)
+    if cache is not None:
+        results = _map_ordered(functools.partial(_call_counted, func, cache),
+                               items, executor, workers)
+        for _, stats in results:
+            if stats is not None:
+                cache._add_stats(stats)
+        return [result for result, _ in results]
+    if executor is not None:
+        return list(executor.map(func, items))
+    if workers is not None and workers > 1 and len(items) > 1:
+        chunksize = max(1, len(items) // (4 * workers))
+        with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+            return list(executor.map(func, items, chunksize=chunksize))
+    return list(map(func, items))
+
+
+def _call_counted(func, cache, item):
+    """
+    :return: `func(item, cache=cache)`, and the change of the stats of
+        `cache` if it is a copy, in a worker process (None otherwise)
+    """
+    if cache.pid == os.getpid():
+        return func(item, cache=cache), None
+    stats = cache._stats()
+    result = func(item, cache=cache)
+    return result, tuple(new - old for new, old in zip(cache._stats(), stats))
+
+
+def _select_handles(paths, instrument=None):
+    """
+    Filter daily files to match a uniform site/instrument
+    (if not specified, site is taken from the first filename).
+    :return: meta, list of selected `DailyFileHandle`s (sorted by path)
+    """
+    if instrument is not None:
+        meta = dict(site=instrument[:4], instrument=instrument)
+    elif len(paths) == 0:
+        meta = {}
+    else:
+        handle = DailyFileHandle(paths[0])
+        meta = dict(
+            site=handle.site,
+            instrument=handle.instrument
+        )
+
+    filehandles = map(DailyFileHandle, sorted(paths))
+    selected = []
+    for key, handles in itertools.groupby(filehandles, _filehandle_key):
+        if key[0] != meta['instrument']:
+            continue
+
+        handles = list(handles)
+        assert len(handles) in {1, 2}, 'Duplicate input files?'
+        selected.extend(handles)
+    return meta, selected
@@ -0,0 +1,145 @@
+"""
+Plotting of site measurements. Imported on first use by
+`SiteMeasurements.plot`, so that matplotlib is only loaded when plotting.
+"""
+import weakref
+import numpy as np
+import matplotlib.pyplot as plt
+from .site_measurements import _srf_range
+plt.switch_backend('Agg')
+
+# Decimated traces of each measurements object, reused across renders
+_trace_cache = weakref.WeakKeyDictionary()
+
+
+_names = dict(
+    sr='Surface Reflectance',
+    toa='Top Of Atmosphere Reflectance',
+    P='Surface atmospheric pressure in mb',
+    T='Surface temperature in Kelvin',
+    WV='Water Vapor in g/cm',
+    O3='Ozone column in Dobsons',
+    AOD='Aerosol Optical depth at 550 nm',
+    Ang='Aerosol Angstrom coefficient',
+)
+
+
+def _decimate(times, values, errors, nbuckets):
+    """
+    Min/max decimation of the columns of `values`, sharing the sorted
+    `times`: the samples are split into `nbuckets` time buckets, in which
+    the minimum and maximum of each column are kept (in time order), and
+    the error band spans the lowest and highest `values -/+ errors`.
+    :return: x, y of shape (2 * N buckets, N columns), and the error band as
+        band_x of shape (2 * N buckets,), lower and upper of the same shape
+        as y
+    """
+    nrows, ncols = values.shape
+    lower, upper = values - errors, values + errors
+    t = times.view('i8')
+    if nrows <= 2 * nbuckets:
+        return (np.repeat(times[:, None], ncols, axis=1), values,
+                times, lower, upper)
+    # (multiplying first would overflow over long time spans)
+    buckets = (t - t[0]) // ((t[-1] - t[0]) // nbuckets + 1)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    rows = np.arange(nrows)[:, None]
+    bucket_rows = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, nrows]))
+    picks = []
+    for reduce in [np.fmin, np.fmax]:
+        extreme = reduce.reduceat(values, starts, axis=0)
+        picks.append(np.minimum.reduceat(
+            np.where(values == extreme[bucket_rows], rows, nrows), starts, axis=0))
+    # rows of the minimum and maximum, in time order (nrows where all NaN)
+    pos = np.sort(np.stack(picks, axis=1), axis=1).reshape(-1, ncols)
+    cols = np.arange(ncols)
+    y = np.where(pos < nrows, values[np.minimum(pos, nrows - 1), cols], np.nan)
+    x = times[np.minimum(pos, nrows - 1)]
+    band_x = times[np.stack([starts, np.r_[starts[1:], nrows] - 1], axis=1).ravel()]
+    band_lower = np.repeat(np.fmin.reduceat(lower, starts, axis=0), 2, axis=0)
+    band_upper = np.repeat(np.fmax.reduceat(upper, starts, axis=0), 2, axis=0)
+    return x, y, band_x, band_lower, band_upper
+
+
+def _traces(sm, table, columns, nbuckets):
+    """
+    Decimated traces of `columns` of `table` (see `_decimate`), cached per
+    measurements object (whose tables are not expected to change in place)
+    """
+    data, errs = getattr(sm, table), getattr(sm, table + '_errs')
+    cache = _trace_cache.setdefault(sm, {})
+    key = (table, tuple(columns), nbuckets)
+    frames, traces = cache.get(key, (None, None))
+    if frames is None or frames[0] is not data or frames[1] is not errs:
+        traces = _decimate(data.index.values.astype('datetime64[ns]'),
+                           data[columns].to_numpy(float), errs[columns].to_numpy(float),
+                           nbuckets)
+        cache[key] = ((data, errs), traces)
+    return traces
+
+
+def _plot_decimated(sm, table, columns, labels, with_errors, nbuckets):
+    x, y, band_x, lower, upper = _traces(sm, table, columns, nbuckets)
+    ax = plt.gca()
+    for i, label in enumerate(labels):
+        line, = ax.plot(x[:, i], y[:, i], label=label)
+        if with_errors:
+            ax.fill_between(band_x, lower[:, i], upper[:, i], color=line.get_color(),
+                            alpha=0.3, linewidth=0)
+
+
+def plot_measurements(sm, measurements, spectrum=None, with_errors=True, fig=None, show=True,
+                      decimate=None):
+    """
+    Plot measurements of `sm`. See `SiteMeasurements.plot`
+    """
+    def _plot(data, err, with_errors, label):
+        if with_errors:
+            artists = plt.errorbar(data.index.values, data.values, yerr=err)
+            artists.lines[0].set_label(label)
+        else:
+            artists = plt.plot(data.index.values, data.values)
+            artists[0].set_label(label)
+
+    if fig is None:
+        fig = plt.figure()
+    if isinstance(measurements, str):
+        measurements = [measurements]
+    reflectance = 'toa' in measurements or 'sr' in measurements
+    if decimate is True:
+        decimate = int(fig.get_figwidth() * fig.dpi)
+    for measurement in measurements:
+        if decimate:
+            if reflectance:
+                table = measurement
+                columns = [wv for wv in _srf_range if wv in spectrum and
+                           wv in getattr(sm, table).columns]
+                labels = ['%s at %snm' % (measurement, wv) for wv in columns]
+            else:
+                table, columns, labels = 'weather', [measurement], [_names[measurement]]
+            _plot_decimated(sm, table, columns, labels, with_errors, decimate)
+        elif reflectance:
+            spectrum_values = [wv for wv in _srf_range if wv in spectrum]
+            for wv in spectrum_values:
+                try:
+                    data = getattr(sm, measurement)[wv]
+                    err = getattr(sm, '%s_errs' % measurement)[wv]
+                    _plot(data, err, with_errors=with_errors, label='%s at %snm' % (measurement, wv))
+                except KeyError:  # provided invalid parameter
+                    pass
+        else:
+            data = sm.weather[measurement]
+            err = sm.weather_errs[measurement]
+            _plot(data, err, with_errors=with_errors, label=_names[measurement])
+
+    fig.autofmt_xdate()
+    plt.title('%s in %s' % ('Reflectance' if reflectance else 'Weather', sm.meta['site']))
+    plt.grid()
+    plt.legend(bbox_to_anchor=(1.04, 1), loc="upper left")
+    try:
+        plt.tight_layout()
+    except ValueError:  # https://github.com/matplotlib/matplotlib/issues/5456
+        pass
+    if show:
+        plt.show()
+    return fig
@@ -1,10 +1,10 @@
-import itertools
-import matplotlib.pyplot as plt
+import functools
 import numpy as np
 import pandas as pd
-from .daily_file import read_daily_file
-from .file_handle import DailyFileHandle
-plt.switch_backend('Agg')
+from . import instrumentation
+from .loading import (
+    _as_timedelta, _meta_coords, _read_dailyfile, _map_ordered,
+    _select_handles, _is_empty, _plan_reads, _read_item, _stage_tables)
 
 
 _srf_range = list(range(400, 2500+1, 10))
@@ -14,44 +14,235 @@ _table_columns = dict(
     sr=_srf_range, sr_errs=_srf_range,
     toa=_srf_range, toa_errs=_srf_range
 )
-_names = dict(
-    sr='Surface Reflectance',
-    toa='Top Of Atmosphere Reflectance',
-    P='Surface atmospheric pressure in mb',
-    T='Surface temperature in Kelvin',
-    WV='Water Vapor in g/cm',
-    O3='Ozone column in Dobsons',
-    AOD='Aerosol Optical depth at 550 nm',
-    Ang='Aerosol Angstrom coefficient',
-)
 
 
-# TODO: this method sorts the columns as well (by their names)
-# we should prefer to avoid this in case of weather dataframes...
-def _dataframe_merge(df1, df2):
+def _as_datetime64(times):
+    return np.asarray(pd.DatetimeIndex(times).values, dtype='datetime64[ns]')
+
+
+def _take_rows(df, pos, index):
+    """
+    Take rows of `df` by position, with NaN rows where `pos` is -1
+    """
+    rows = df.reset_index(drop=True).reindex(pos)
+    rows.index = pd.DatetimeIndex(index)
+    return rows
+
+
+def _band_weights(srfs, wavelengths, resolution=1.):
+    """
+    Resample spectral response functions onto the `wavelengths` axis:
+    each response is integrated by the midpoint rule over `resolution` nm
+    intervals, and every interval is attributed to the nearest wavelength
+    of the axis.
+    The axis must be a contiguous range of the wavelengths of the files
+    (e.g. not a projection on a few wavelengths), covering the support of
+    the responses.
+    :return: normalized weights, of shape (N wavelengths, N bands)
+    """
+    steps = np.diff(wavelengths)
+    assert np.allclose(steps, _srf_range[1] - _srf_range[0]), \
+        'Band averages need a contiguous wavelength axis'
+    edges = (wavelengths[1:] + wavelengths[:-1]) / 2
+    half_step = (wavelengths[-1] - wavelengths[0]) / (len(wavelengths) - 1) / 2 \
+        if len(wavelengths) > 1 else resolution
+    weights = np.zeros((len(wavelengths), len(srfs)))
+    for i, (srf_wavelengths, response) in enumerate(srfs.values()):
+        srf_wavelengths = np.asarray(srf_wavelengths, dtype=float)
+        fine = np.arange(srf_wavelengths.min() + resolution / 2,
+                         srf_wavelengths.max(), resolution)
+        fine_response = np.interp(fine, srf_wavelengths, response, left=0., right=0.)
+        inside = ((fine >= wavelengths[0] - half_step) &
+                  (fine <= wavelengths[-1] + half_step))
+        assert not fine_response[~inside].any(), \
+            'Spectral response out of the wavelength range'
+        bins = np.searchsorted(edges, fine[inside])
+        weights[:, i] = np.bincount(bins, fine_response[inside],
+                                    minlength=len(wavelengths))
+        total = weights[:, i].sum()
+        assert total > 0, 'Spectral response out of the wavelength range'
+        weights[:, i] /= total
+    return weights
+
+
+def _time_bins(times, step, origin):
+    """
+    Split sorted `times` into bins of length `step`, aligned to `origin`.
+    :return: first row of each (non-empty) bin, start time of each bin
+    """
+    codes = (times - origin) // step
+    starts = np.flatnonzero(np.r_[True, codes[1:] != codes[:-1]]) \
+        if len(codes) else np.zeros(0, dtype=int)
+    return starts, origin + codes[starts] * step
+
+
+def _reduce_bins(values, errors, starts, how='mean', correlated=False):
+    """
+    Aggregate the rows of `values` and `errors` over the bins starting at
+    rows `starts`, leaving out NaN values.
+    :return: values, errors and counts of valid values, of shape
+        (N bins, N columns)
+    """
+    nrows, ncols = values.shape
+    if not nrows:
+        return values.copy(), errors.copy(), np.zeros(values.shape, dtype=int)
+    valid = ~np.isnan(values)
+    counts = np.add.reduceat(valid.astype(int), starts, axis=0)
+    if how == 'mean':
+        errors = np.where(valid, errors, 0.)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = np.add.reduceat(np.where(valid, values, 0.), starts, axis=0) / counts
+            if correlated:
+                result_errs = np.add.reduceat(errors, starts, axis=0) / counts
+            else:
+                result_errs = np.sqrt(np.add.reduceat(np.square(errors), starts, axis=0)) / counts
+        result_errs[np.logical_or.reduceat(np.isnan(errors), starts, axis=0)] = np.nan
+    else:
+        # error of the selected sample (the first one, in case of ties)
+        result = (np.fmin if how == 'min' else np.fmax).reduceat(values, starts, axis=0)
+        bins = np.repeat(np.arange(len(starts)), np.diff(np.r_[starts, nrows]))
+        rows = np.where(values == result[bins], np.arange(nrows)[:, None], nrows)
+        pos = np.minimum.reduceat(rows, starts, axis=0)
+        result_errs = np.where(pos < nrows,
+                               errors[np.minimum(pos, nrows - 1), np.arange(ncols)],
+                               np.nan)
+    return result, result_errs, counts
+
+
+def _interp_columns(times, queries, values, errors, max_gap=None, correlated=False):
+    """
+    Interpolate each column of `values` and `errors` linearly at `queries`,
+    between the nearest valid (not NaN) samples of the column on each side.
+    Queries out of the range of valid samples, or between samples more than
+    `max_gap` apart, are left NaN.
+    :return: values, errors, of shape (N queries, N columns)
+    """
+    nrows, ncols = values.shape
+    result = np.full((len(queries), ncols), np.nan)
+    if not nrows:
+        return result, result.copy()
+    valid = ~np.isnan(values)
+    rows = np.arange(nrows)[:, None]
+    last_valid = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    next_valid = np.minimum.accumulate(np.where(valid, rows, nrows)[::-1], axis=0)[::-1]
+    pos = np.searchsorted(times, queries, side='right')[:, None]
+    left = np.where(pos > 0, last_valid[np.maximum(pos[:, 0] - 1, 0)], -1)
+    right = np.where(pos < nrows, next_valid[np.minimum(pos[:, 0], nrows - 1)], nrows)
+    left_c, right_c = np.maximum(left, 0), np.minimum(right, nrows - 1)
+    t = times.view('i8')
+    t_left, t_right = t[left_c], t[right_c]
+    q = queries.view('i8')[:, None]
+    exact = (left >= 0) & (t_left == q)
+    found = exact | ((left >= 0) & (right < nrows))
+    if max_gap is not None:
+        found &= exact | (t_right - t_left <= np.timedelta64(max_gap, 'ns').view('i8'))
+    cols = np.arange(ncols)
+    left_values, right_values = values[left_c, cols], values[right_c, cols]
+    left_errs, right_errs = errors[left_c, cols], errors[right_c, cols]
+    exact_errs = left_errs[exact]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        w = (q - t_left) / (t_right - t_left)
+        w[exact] = 0.
+        result = left_values + w * (right_values - left_values)
+        left_errs *= 1 - w
+        right_errs *= w
+        if correlated:
+            result_errs = left_errs + right_errs
+        else:
+            result_errs = np.hypot(left_errs, right_errs)
+    # exact samples are kept as such (even next to NaN samples)
+    result[exact] = left_values[exact]
+    result_errs[exact] = exact_errs
+    result[~found] = np.nan
+    result_errs[~found] = np.nan
+    return result, result_errs
+
+
+def _frame_nbytes(df):
     """
-    Merge two dataframes (with same columns) by index.
+    Memory used by `df`, as `df.memory_usage(deep=True).sum()`, but only
+    going through the non-numeric columns one by one
     """
-    return df1.merge(df2, how='outer', on=list(df2.columns),
-                     left_index=True, right_index=True)
+    numeric = np.array([isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM'
+                        for dtype in df.dtypes], dtype=bool)
+    nbytes = df.index.memory_usage(deep=True)
+    nbytes += len(df) * sum(dtype.itemsize for dtype in df.dtypes[numeric])
+    if not numeric.all():
+        nbytes += df.iloc[:, ~numeric].memory_usage(deep=True, index=False).sum()
+    return int(nbytes)
 
 
-def _filehandle_key(handle):
-    return handle.instrument, handle.date.date()
+def _empty_frame(key, wavelengths=None, weather=None):
+    """
+    Empty table with the expected columns of `key` (see `_table_columns`),
+    or only those of the `wavelengths` and `weather` projections
+    """
+    columns = _table_columns[key]
+    if wavelengths is not None and not key.startswith('weather'):
+        columns = [col for col in columns if col in set(wavelengths)]
+    if weather is not None and key.startswith('weather'):
+        columns = [col for col in columns if col in set(weather)]
+    return pd.DataFrame(
+        {col: pd.Series([], dtype=object if col == 'Type' else float)
+         for col in columns},
+        index=pd.DatetimeIndex([]))
 
 
-def _meta_coords(meta):
-    return tuple(meta[key] for key in ['Lon', 'Lat', 'Alt'])
+def _dedup_sort(df):
+    """
+    Sort rows by time, keeping a single copy of rows that are exact duplicates
+    (same timestamp and values). Rows sharing a timestamp but holding
+    different values are all kept, in order of appearance.
+    """
+    if df.index.has_duplicates:
+        df = df[~df.reset_index().duplicated().values]
+    if not df.index.is_monotonic_increasing:
+        df = df.sort_index(kind='mergesort')
+    return df
 
 
-def _process_dailyfile(path, meta=None):
+def _dataframe_concat(frames, key, keep=None):
+    """
+    Merge a sequence of dataframes (with same columns) by index, in one pass:
+    the rows are concatenated once, then stably sorted by time (O(n log n) in
+    the total number of rows, but no sort is done when the concatenated rows
+    are already in order, e.g. consecutive days).
+    :param keep: None to keep all rows (but a single copy of exact
+        duplicates), 'first' or 'last' to keep a single row per timestamp,
+        from the first or last frame holding it
+    """
+    frames = list(frames)
+    if not any(len(df) for df in frames):
+        # keep the columns of the (possibly projected) empty frames
+        return frames[0].copy() if frames else _empty_frame(key)
+    frames = [df for df in frames if len(df)]
+    with instrumentation.stage('concat'):
+        df = pd.concat(frames)
+        if keep is None:
+            return _dedup_sort(df)
+        if not df.index.is_monotonic_increasing:
+            df = df.iloc[np.argsort(df.index.values, kind='stable')]
+        if df.index.has_duplicates:
+            df = df[~df.index.duplicated(keep=keep)]
+        return df
+
+
+def _process_dailyfile(path, meta=None, cache=None):
     """
     Do some validation and conversions on data read from file.
     Update the site coordinates in `meta` if not already done.
     :return: weather, weather_errs, srf, srf_errs, `meta`
     """
-    (file_meta, times,
-     weather, weather_errs, srf, srf_errs) = read_daily_file(path)
+    return _dailyfile_frames(_read_dailyfile(path, cache), meta)
+
+
+def _dailyfile_frames(arrays, meta=None, types=True):
+    """
+    Validate the (masked) arrays of a daily file against `meta`,
+    and convert them to dataframes. See `_process_dailyfile`.
+    :param types: if False, leave out the 'Type' column
+    """
+    file_meta = arrays.metadata
     if meta is None:
         meta = {'instrument': file_meta['Site']}
     assert file_meta['Site'] == meta['instrument'], 'File metadata not matching expected data'
@@ -60,18 +251,18 @@ def _process_dailyfile(path, meta=None):
                    for key in ['Lon', 'Lat', 'Alt'])
     assert _meta_coords(file_meta) == coords, 'Site coordinates not matching other files'
 
-    weather = pd.DataFrame(weather, index=times)
-    weather_errs = pd.DataFrame(weather_errs, index=times)
-    # Note: take care to skip the non-numeric 'Type' (Aerosol type) column
-    # (which is not available in the weather_errs data)
-    for col in weather_errs.columns:
-        weather.loc[weather[col] >= 9000, col] = np.nan
-        weather_errs.loc[weather_errs[col] >= 9000, col] = np.nan
-
-    srf = pd.DataFrame(srf, index=times)
-    srf[srf >= 9000] = np.nan
-    srf_errs = pd.DataFrame(srf_errs, index=times)
-    srf_errs[srf_errs >= 9000] = np.nan
+    times = pd.DatetimeIndex(arrays.times)
+    # Note: the non-numeric 'Type' (Aerosol type) column is kept apart
+    # (it is not available in the weather_errs data)
+    weather = pd.DataFrame(arrays.weather, index=times,
+                           columns=arrays.weather_keys)
+    if types:
+        weather['Type'] = arrays.types
+    weather_errs = pd.DataFrame(arrays.weather_errs, index=times,
+                                columns=arrays.weather_keys)
+    srf = pd.DataFrame(arrays.srf, index=times, columns=arrays.wavelengths)
+    srf_errs = pd.DataFrame(arrays.srf_errs, index=times,
+                            columns=arrays.wavelengths)
     return weather, weather_errs, srf, srf_errs, meta
 
 
@@ -84,51 +275,303 @@ class SiteMeasurements:
         self.meta = meta
 
     @classmethod
-    def from_pathlist(cls, paths, instrument=None):
+    def from_pathlist(cls, paths, instrument=None, cache=None,
+                      executor=None, workers=None, skip_empty=False,
+                      tables=None, wavelengths=None, weather=None):
         """
         Build measurements from a list of filename.
         Filenames are filtered to match a uniform site/instrument.
         (if not specified, site is taken from the first filename).
+        :param cache: optional `FileCache` of parsed files
+        :param executor: optional `concurrent.futures.Executor`, used to
+            parse the files in parallel
+        :param workers: if no `executor` is given, number of processes used
+            to parse the files (default: parse in the calling thread)
+        :param skip_empty: if True, leave out files without any valid
+            spectral value (their weather data included), or, when only the
+            weather tables are loaded, without any valid weather value
+        :param tables: optional subset of the tables to load, e.g. ['toa']
+            (the other tables are left empty); files that are not needed,
+            such as `.input` files for 'toa' alone, are not read
+        :param wavelengths: optional subset of the wavelengths to load
+        :param weather: optional subset of the weather columns to load,
+            e.g. ['AOD', 'WV'] (add 'Type' for the aerosol type)
         """
-        if instrument is not None:
-            meta = dict(site=instrument[:4], instrument=instrument)
-        elif len(paths) == 0:
-            meta = {}
-        else:
-            handle = DailyFileHandle(paths[0])
-            meta = dict(
-                site=handle.site,
-                instrument=handle.instrument
-            )
-
-        filehandles = map(DailyFileHandle, sorted(paths))
-        data = {key: pd.DataFrame([], columns=_table_columns[key])
-                for key in _table_columns.keys()}
-        for key, handles in itertools.groupby(filehandles, _filehandle_key):
-            if key[0] != meta['instrument']:
-                continue
+        with instrumentation.stage('select_files'):
+            meta, selected = _select_handles(paths, instrument)
+            selected, items = _plan_reads(selected, tables, wavelengths)
+        # Parse the files (possibly in parallel), then validate them in order
+        parsed = _map_ordered(functools.partial(_read_item, weather=weather),
+                              items, executor, workers, cache)
+        return cls._from_parsed(selected, parsed, meta, skip_empty, tables, weather,
+                                wavelengths)
 
-            handles = list(handles)
-            assert len(handles) in {1, 2}, 'Duplicate input files?'
-
-            for handle in handles:
-                (weather, weather_errs,
-                 srf, srf_errs, _meta) = _process_dailyfile(handle.path, meta)
-                for key in ['weather', 'weather_errs']:
-                    data[key] = _dataframe_merge(data[key], locals()[key])
-
-                names = {
-                    'input': ['sr', 'sr_errs'],
-                    'output': ['toa', 'toa_errs']
-                }[handle.stage]
-                for i, df in enumerate([srf, srf_errs]):
-                    data[names[i]] = _dataframe_merge(data[names[i]], df)
-            # end loop on the two handles
-        # end loop on file-pairs
+    @classmethod
+    def _from_parsed(cls, handles, parsed, meta, skip_empty=False,
+                     tables=None, weather=None, wavelengths=None):
+        """
+        Build measurements from the (masked) arrays parsed from each of the
+        selected `handles`, collecting the per-file blocks, to build each
+        table once at the end.
+        See `from_pathlist` for the `tables`, `weather` and `wavelengths`
+        projections (tables without rows get the projected columns).
+        """
+        types = weather is None or 'Type' in weather
+        blocks = {key: [] for key in _table_columns.keys()
+                  if tables is None or key in tables}
+        for handle, arrays in zip(handles, parsed):
+            with_srf = tables is None or bool(set(_stage_tables[handle.stage]).intersection(tables))
+            if skip_empty and _is_empty(arrays, ('srf',) if with_srf else ('weather',)):
+                instrumentation.count('empty_files_skipped')
+                continue
+            with instrumentation.stage('frames'):
+                frames = _dailyfile_frames(arrays, meta, types)
+            names = ('weather', 'weather_errs') + _stage_tables[handle.stage]
+            for key, df in zip(names, frames):
+                if key in blocks:
+                    blocks[key].append(df)
+        # end loop on files
+        data = {key: _dataframe_concat(blocks.get(key, []), key)
+                for key in _table_columns}
+        for key, df in data.items():
+            if not len(df):
+                data[key] = _empty_frame(key, wavelengths, weather)
         return cls(data['weather'], data['weather_errs'],
                    data['sr'], data['sr_errs'], data['toa'], data['toa_errs'],
                    meta)
 
+    @classmethod
+    def concat(cls, items, keep=None):
+        """
+        Merge any number of measurements of the same instrument, in a single
+        pass over each table (chaining `+` copies the accumulated tables at
+        each step). The column order is kept.
+        :param keep: how rows sharing a timestamp are resolved:
+            None (as `+`) keeps a single copy of rows that are exact
+            duplicates, and all the other rows;
+            'first' / 'last' keep a single row per timestamp, from the first /
+            last of `items` holding one
+        """
+        assert len(items) > 0, 'Nothing to merge'
+        assert keep in {None, 'first', 'last'}, 'Invalid keep: ' + str(keep)
+        meta = items[0].meta
+        for item in items[1:]:
+            assert item.meta == meta, 'metadata must match'
+        instrumentation.count('merges')
+        with instrumentation.stage('merge'):
+            data = {key: _dataframe_concat([getattr(item, key) for item in items], key, keep)
+                    for key in _table_columns}
+        return cls(data['weather'], data['weather_errs'],
+                   data['sr'], data['sr_errs'], data['toa'], data['toa_errs'],
+                   dict(meta))
+
+    @classmethod
+    def _from_parts(cls, parts, meta):
+        """
+        Build measurements from the measurements of consecutive periods
+        (e.g. days) of the same instrument, building each table once.
+        """
+        empty = ([getattr(parts[0], key)[:0] for key in _table_columns] if parts else
+                 [_empty_frame(key) for key in _table_columns])
+        parts = [part for part in parts
+                 if any(len(getattr(part, key)) for key in _table_columns)]
+        meta = dict(parts[0].meta) if parts else dict(meta)
+        for part in parts:
+            assert _meta_coords(part.meta) == _meta_coords(meta), \
+                'Site coordinates not matching other files'
+        # the other header fields may differ between files: keep the first ones
+        items = [part if part.meta == meta else
+                 SiteMeasurements(*[getattr(part, key) for key in _table_columns], meta)
+                 for part in parts]
+        return cls.concat(items or [SiteMeasurements(*empty, meta)])
+
+    def compact(self, dtype=np.float32):
+        """
+        :return: `CompactSiteMeasurements` holding the same data, with the
+            spectral tables stored as a single `dtype` array
+        """
+        from .compact import CompactSiteMeasurements
+        return CompactSiteMeasurements.from_measurements(self, dtype)
+
+    def memory_usage(self):
+        """
+        :return: memory used by the data tables, in bytes
+        """
+        return sum(_frame_nbytes(getattr(self, key)) for key in _table_columns)
+
+    def nearest(self, times, tolerance=None, table='toa'):
+        """
+        Find the nearest sample of `table` to each of `times`, in a single
+        vectorized lookup (ties are resolved to the earlier sample).
+        :param times: query times (array-like of datetimes)
+        :param tolerance: maximal time offset (timedelta, or a string such as
+            '15min'), beyond which queries are left unmatched
+        :return: (rows, offsets), where `rows` is a frame of the matched rows
+            indexed by the query times (NaN where unmatched), and `offsets`
+            is an array of sample time - query time (NaT where unmatched)
+        """
+        df = getattr(self, table)
+        queries = _as_datetime64(times)
+        samples = df.index.values.astype('datetime64[ns]')
+        if len(samples) > 1:
+            pos = np.clip(np.searchsorted(samples, queries, side='left'), 1, len(samples) - 1)
+            before, after = samples[pos - 1], samples[pos]
+            pos -= (queries - before) <= (after - queries)
+            offsets = samples[pos] - queries
+        elif len(samples):
+            pos = np.zeros(len(queries), dtype=int)
+            offsets = samples[pos] - queries
+        else:
+            pos = np.zeros(len(queries), dtype=int)
+            offsets = np.full(len(queries), np.timedelta64('NaT'), 'timedelta64[ns]')
+        valid = ~np.isnat(offsets)
+        if tolerance is not None:
+            tolerance = np.timedelta64(_as_timedelta(tolerance))
+            valid &= np.abs(offsets) <= tolerance
+        offsets[~valid] = np.timedelta64('NaT')
+        return _take_rows(df, np.where(valid, pos, -1), queries), offsets
+
+    def within(self, times, window, table='toa'):
+        """
+        Find all samples of `table` within +/-`window` of each of `times`,
+        in a single vectorized lookup.
+        :param window: timedelta, or a string such as '30min'
+        :return: (rows, offsets), where `rows` is a frame of the matched rows,
+            indexed by (query number, sample time), and `offsets` is an array
+            of sample time - query time
+        """
+        df = getattr(self, table)
+        queries = _as_datetime64(times)
+        samples = df.index.values.astype('datetime64[ns]')
+        window = np.timedelta64(_as_timedelta(window))
+        first = np.searchsorted(samples, queries - window, side='left')
+        counts = np.searchsorted(samples, queries + window, side='right') - first
+        query_nums = np.repeat(np.arange(len(queries)), counts)
+        pos = (np.repeat(first, counts) + np.arange(counts.sum()) -
+               np.repeat(np.cumsum(counts) - counts, counts))
+        rows = df.iloc[pos]
+        rows.index = pd.MultiIndex.from_arrays(
+            [query_nums, rows.index], names=['query', 'time'])
+        return rows, samples[pos] - queries[query_nums]
+
+    def band_average(self, srfs, table='toa', correlated=False,
+                     min_coverage=0.):
+        """
+        Compute band-averaged reflectances for sensor spectral response
+        functions, for all timestamps at once.
+        Missing (NaN) samples are left out of the average, which is
+        renormalized by the response weight of the remaining samples.
+        :param srfs: dict of band name -> (wavelengths in nm, response)
+        :param table: 'toa' or 'sr'
+        :param correlated: if True, errors are propagated as fully correlated
+            across wavelengths (otherwise as independent)
+        :param min_coverage: minimal fraction of the band response covered
+            by valid samples, below which the result is NaN
+        :return: (values, errors) frames, with a column per band
+        """
+        df, errs = getattr(self, table), getattr(self, table + '_errs')
+        assert df.index.equals(errs.index) and df.columns.equals(errs.columns), \
+            'Values and errors not matching'
+        weights = _band_weights(srfs, np.asarray(df.columns, dtype=float))
+        values, errors = df.values, errs.values
+        valid = ~np.isnan(values)
+        coverage = valid @ weights
+        result = np.where(valid, values, 0.) @ weights
+        missing_errors = (valid & np.isnan(errors)) @ (weights > 0)
+        errors = np.where(valid, errors, 0.)
+        if correlated:
+            result_errs = errors @ weights
+        else:
+            result_errs = np.sqrt(np.square(errors) @ np.square(weights))
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result /= coverage
+            result_errs /= coverage
+        # the coverage of fully covered bands may miss 1 by rounding errors
+        uncovered = (coverage < min_coverage - 1e-9) | (coverage == 0)
+        result[uncovered] = np.nan
+        result_errs[uncovered | (missing_errors > 0)] = np.nan
+        columns = list(srfs.keys())
+        return (pd.DataFrame(result, index=df.index, columns=columns),
+                pd.DataFrame(result_errs, index=df.index, columns=columns))
+
+    def _value_errors(self, key):
+        """
+        :return: numeric values of the table `key`, and its errors table
+        """
+        df, errs = getattr(self, key), getattr(self, key + '_errs')
+        df = df[[col for col in df.columns if col != 'Type']]
+        assert df.index.equals(errs.index) and list(df.columns) == list(errs.columns), \
+            'Values and errors not matching'
+        return df, errs
+
+    def resample(self, freq, how='mean', origin=None, correlated=False):
+        """
+        Aggregate all the tables over time bins, with vectorized reductions.
+        NaN samples are left out. Errors of means are propagated as
+        independent (or fully `correlated`) errors of the averaged samples;
+        errors of minima and maxima are those of the selected samples.
+        The aerosol 'Type' of a bin is that of its first sample, and bins
+        without samples are left out.
+        :param freq: bin length (timedelta, or a string such as '1D')
+        :param how: 'mean', 'min' or 'max'
+        :param origin: time the bins are aligned to (default: midnight)
+        :return: (measurements, counts), where `counts` is a dict of
+            'weather', 'sr' and 'toa' frames holding the number of valid
+            samples of each bin and column
+        """
+        assert how in {'mean', 'min', 'max'}, 'Unsupported aggregation: ' + how
+        step = np.timedelta64(_as_timedelta(freq), 'ns')
+        origin = np.datetime64('1970-01-01' if origin is None else origin, 'ns')
+        data, counts = {}, {}
+        for key in ['weather', 'sr', 'toa']:
+            df, errs = self._value_errors(key)
+            starts, bins = _time_bins(df.index.values.astype('datetime64[ns]'), step, origin)
+            result, result_errs, count = _reduce_bins(
+                df.to_numpy(float), errs.to_numpy(float), starts, how, correlated)
+            index = pd.DatetimeIndex(bins, name=df.index.name)
+            data[key] = pd.DataFrame(result, index=index, columns=df.columns)
+            data[key + '_errs'] = pd.DataFrame(result_errs, index=index, columns=errs.columns)
+            counts[key] = pd.DataFrame(count, index=index, columns=df.columns)
+            if key == 'weather' and 'Type' in self.weather.columns:
+                data[key]['Type'] = self.weather['Type'].to_numpy()[starts]
+        return SiteMeasurements(data['weather'], data['weather_errs'],
+                                data['sr'], data['sr_errs'], data['toa'], data['toa_errs'],
+                                dict(self.meta)), counts
+
+    def interpolate_to(self, times, max_gap=None, correlated=False):
+        """
+        Interpolate all the tables linearly onto `times`, with vectorized
+        lookups. Each column is interpolated between its nearest valid
+        samples, and errors are propagated as independent (or fully
+        `correlated`) errors of the two samples. The aerosol 'Type' is that
+        of the nearest sample.
+        :param times: target times (array-like of datetimes)
+        :param max_gap: maximal time between the two samples (timedelta, or
+            a string such as '2h'), beyond which values are left NaN
+            (samples at the exact target times are always kept)
+        :return: measurements indexed by `times`
+        """
+        queries = _as_datetime64(times)
+        if max_gap is not None:
+            max_gap = np.timedelta64(_as_timedelta(max_gap), 'ns')
+        data = {}
+        for key in ['weather', 'sr', 'toa']:
+            df, errs = self._value_errors(key)
+            result, result_errs = _interp_columns(
+                df.index.values.astype('datetime64[ns]'), queries,
+                df.to_numpy(float), errs.to_numpy(float), max_gap, correlated)
+            index = pd.DatetimeIndex(queries, name=df.index.name)
+            data[key] = pd.DataFrame(result, index=index, columns=df.columns)
+            data[key + '_errs'] = pd.DataFrame(result_errs, index=index, columns=errs.columns)
+        if 'Type' in self.weather.columns:
+            rows, _ = self.nearest(queries, table='weather')
+            types = rows['Type'].to_numpy(dtype=object)
+            types[data['weather'].isna().all(axis=1).to_numpy()] = None
+            data['weather']['Type'] = types
+        return SiteMeasurements(data['weather'], data['weather_errs'],
+                                data['sr'], data['sr_errs'], data['toa'], data['toa_errs'],
+                                dict(self.meta))
+
     def __getitem__(self, key):
         """
         Take a time slice out of each of the weather and the data
@@ -141,63 +584,23 @@ class SiteMeasurements:
 
     def __add__(self, other):
         """
-        Merge each of the data tables of self & other
+        Merge each of the data tables of self & other (see `concat`)
         """
-        assert self.meta == other.meta, 'metadata must match'
-        weather = _dataframe_merge(self.weather, other.weather)
-        weather_errs = _dataframe_merge(self.weather_errs, other.weather_errs)
-        sr = _dataframe_merge(self.sr, other.sr)
-        sr_errs = _dataframe_merge(self.sr_errs, other.sr_errs)
-        toa = _dataframe_merge(self.toa, other.toa)
-        toa_errs = _dataframe_merge(self.toa_errs, other.toa_errs)
-        meta = dict(self.meta)
-        return type(self)(weather, weather_errs, sr, sr_errs, toa, toa_errs, meta)
+        return type(self).concat([self, other])
 
-    def plot(self, measurements, spectrum=None, with_errors=True, fig=None, show=True):
+    def plot(self, measurements, spectrum=None, with_errors=True, fig=None, show=True,
+             decimate=None):
         """
         :param measurements: single or list, among: {'toa', 'sr', 'P', 'T', 'WV', 'O3', 'AOD', 'Ang'}
         :param spectrum: if 'toa' or 'sr', specify wavelengths, e. g. [400, 600] or range(500,700)
         :param with_errors: if True =- shows error bars
         :param fig:
         :param show: if True - draws plot
+        :param decimate: number of time buckets (True: the figure width in
+            pixels) to decimate the series to, keeping the min/max of each
+            bucket, with errors drawn as bands. The decimated traces are
+            reused by later plots of the same measurements.
         :return: plt figure
         """
-        def _plot(data, err, with_errors, label):
-            if with_errors:
-                artists = plt.errorbar(data.index.values, data.values, yerr=err)
-                artists.lines[0].set_label(label)
-            else:
-                artists = plt.plot(data.index.values, data.values)
-                artists[0].set_label(label)
-
-        if fig is None:
-            fig = plt.figure()
-        if isinstance(measurements, str):
-            measurements = [measurements]
-        reflectance = 'toa' in measurements or 'sr' in measurements
-        for measurement in measurements:
-            if reflectance:
-                spectrum_values = [wv for wv in _srf_range if wv in spectrum]
-                for wv in spectrum_values:
-                    try:
-                        data = getattr(self, measurement)[wv]
-                        err = getattr(self, '%s_errs' % measurement)[wv]
-                        _plot(data, err, with_errors=with_errors, label='%s at %snm' % (measurement, wv))
-                    except KeyError:  # provided invalid parameter
-                        pass
-            else:
-                data = self.weather[measurement]
-                err = self.weather_errs[measurement]
-                _plot(data, err, with_errors=with_errors, label=_names[measurement])
-
-        fig.autofmt_xdate()
-        plt.title('%s in %s' % ('Reflectance' if reflectance else 'Weather', self.meta['site']))
-        plt.grid()
-        plt.legend(bbox_to_anchor=(1.04, 1), loc="upper left")
-        try:
-            plt.tight_layout()
-        except ValueError:  # https://github.com/matplotlib/matplotlib/issues/5456
-            pass
-        if show:
-            plt.show()
-        return fig
+        from .plotting import plot_measurements
+        return plot_measurements(self, measurements, spectrum, with_errors, fig, show, decimate)
@@ -0,0 +1,156 @@
+"""
+Helpers for generating synthetic RadCalNet data, for tests and benchmarks.
+Files are written in the daily file format parsed by `read_daily_file`.
+"""
+import os
+import datetime as dt
+import numpy as np
+
+
+site_coords = {
+    'RVUS': (38.497, -115.690, 1435.0),
+    'LCFR': (43.559, 4.864, 20.0),
+    'BTCN': (40.85486, 109.6272, 1270.0),
+    'GONA': (-23.600, 15.120, 510.0),
+}
+
+_weather_keys = ['P', 'T', 'WV', 'O3', 'AOD', 'Ang']
+_wavelengths = list(range(400, 2500+1, 10))
+table_keys = ['weather', 'weather_errs', 'sr', 'sr_errs', 'toa', 'toa_errs']
+
+
+def daily_filename(instrument, date, stage, version=(2, 3)):
+    """
+    Build a filename as published by RadCalNet, e.g.
+    'BTCN02_2018_148_v02.03.output'
+    """
+    return '{}_{}_v{:02d}.{:02d}.{}'.format(
+        instrument, date.strftime('%Y_%j'),
+        version[0] if stage == 'output' else 0, version[1], stage)
+
+
+def _format_value(val, fmt):
+    # fill values are written as integers, as in the published files
+    if isinstance(val, float) and val >= 9000:
+        return '{:6.0f}'.format(val)
+    return fmt.format(val)
+
+
+def _row(head, vals, fmt):
+    return '\t'.join([head] + [_format_value(val, fmt) for val in vals]) + '\t\n'
+
+
+def write_daily_file(f, metadata, times, weather, weather_errs, srf, srf_errs):
+    """
+    Write a daily file. Inverse of `read_daily_file`:
+    `f` may be either a file-like object or a local path.
+    """
+    if isinstance(f, str):
+        with open(f, 'wt') as fobj:
+            return write_daily_file(fobj, metadata, times, weather,
+                                    weather_errs, srf, srf_errs)
+    f.write('Site:\t{}\n'.format(metadata['Site']))
+    for key in ['Lat', 'Lon', 'Alt']:
+        f.write('{}:\t{}\n'.format(key, metadata[key]))
+    f.write('\n')
+
+    local_offset = dt.timedelta(hours=round(metadata['Lon'] / 15))
+    local = [t + local_offset for t in times]
+    f.write(_row('Year:', [t.year for t in times], '{}'))
+    f.write(_row('DOY(U):', [t.timetuple().tm_yday for t in times], '{}'))
+    f.write(_row('UTC:', [t.strftime('%H:%M') for t in times], '{}'))
+    f.write(_row('DOY(L):', [t.timetuple().tm_yday for t in local], '{}'))
+    f.write(_row('Local:', ['{}:{:02d}'.format(t.hour, t.minute)
+                            for t in local], '{}'))
+    for key in _weather_keys:
+        f.write(_row(key + ':', weather[key], '{:.4f}'))
+    f.write(_row('Type:', weather['Type'], '{}'))
+    for wv, vals in srf.items():
+        f.write(_row(str(wv), vals, '{:.4f}'))
+    f.write('\n')
+
+    for key in _weather_keys:
+        f.write(_row(key + ':', weather_errs[key], '{:.4f}'))
+    for wv, vals in srf_errs.items():
+        f.write(_row(str(wv), vals, '{:.4f}'))
+
+
+def synthetic_day(instrument, date, nsamples=13, first_hour=1, seed=None,
+                  fill_fraction=0.):
+    """
+    Generate plausible measurements for one day, sampled every 30 minutes.
+    :param fill_fraction: approximate fraction of missing values, marked
+        with fill values (9996-9999) as in the published files:
+        spectra of the first samples of the day, the far SWIR end of all
+        spectra, and scattered weather values
+    :return: metadata, times, weather, weather_errs, sr, sr_errs, toa, toa_errs
+        in the same layout as returned by `read_daily_file`
+    """
+    rng = np.random.RandomState(seed)
+    lat, lon, alt = site_coords[instrument[:4]]
+    metadata = dict(Site=instrument, Lat=lat, Lon=lon, Alt=alt)
+    start = dt.datetime(date.year, date.month, date.day, first_hour)
+    times = [start + dt.timedelta(minutes=30 * i) for i in range(nsamples)]
+
+    base = dict(P=870, T=290, WV=0.6, O3=280, AOD=0.2, Ang=0.2)
+    weather, weather_errs = {}, {}
+    for key, val in base.items():
+        vals = val * (1 + 0.05 * rng.randn(nsamples))
+        errs = 0.03 * np.abs(vals)
+        missing = rng.rand(nsamples) < fill_fraction / 4
+        vals[missing] = errs[missing] = 9999
+        weather[key], weather_errs[key] = list(vals), list(errs)
+    weather['Type'] = ['R'] * nsamples
+
+    wv = np.array(_wavelengths, dtype=float)
+    sr_curve = 0.1 + 0.3 * (wv - 400) / 2100
+    toa_curve = sr_curve * (0.8 + 0.2 * (wv - 400) / 2100)
+    nmissing = int(round(fill_fraction * nsamples))
+    tables = []
+    for curve in [sr_curve, toa_curve]:
+        vals = curve[:, None] * (1 + 0.02 * rng.randn(len(wv), nsamples))
+        errs = 0.02 * vals
+        if fill_fraction > 0:
+            vals[:, :nmissing] = errs[:, :nmissing] = 9996
+            vals[wv >= 2400] = errs[wv >= 2400] = 9998
+        tables.append({w: list(row) for w, row in zip(_wavelengths, vals)})
+        tables.append({w: list(row) for w, row in zip(_wavelengths, errs)})
+    return (metadata, times, weather, weather_errs) + tuple(tables)
+
+
+def make_store(path, instruments=('BTCN02',), start=dt.date(2018, 1, 1),
+               ndays=10, seed=0, day_step=1, fill_fraction=0., nsamples=13):
+    """
+    Populate a `DataStore` directory tree with synthetic `.input`/`.output`
+    pairs for `ndays` days per instrument, `day_step` days apart (so
+    multi-year archives can be generated with a limited number of files).
+    See `synthetic_day` for the other parameters.
+    :return: list of written paths
+    """
+    paths = []
+    for n, instrument in enumerate(instruments):
+        site_dir = os.path.join(path, instrument[:4])
+        os.makedirs(site_dir, exist_ok=True)
+        for i in range(ndays):
+            date = start + dt.timedelta(days=i * day_step)
+            (metadata, times, weather, weather_errs,
+             sr, sr_errs, toa, toa_errs) = synthetic_day(
+                 instrument, date, nsamples, seed=seed + n * ndays + i,
+                 fill_fraction=fill_fraction)
+            for stage, srf, srf_errs in [('input', sr, sr_errs),
+                                         ('output', toa, toa_errs)]:
+                fpath = os.path.join(
+                    site_dir, daily_filename(instrument, date, stage))
+                write_daily_file(fpath, metadata, times, weather,
+                                 weather_errs, srf, srf_errs)
+                paths.append(fpath)
+    return paths
+
+
+def assert_same_measurements(ms1, ms2):
+    """
+    Assert that two measurements hold equal tables and metadata
+    """
+    for key in table_keys:
+        assert getattr(ms1, key).equals(getattr(ms2, key)), key
+    assert ms1.meta == ms2.meta
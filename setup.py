@@ -26,5 +26,15 @@ setup(
         'Topic :: Utilities',
     ],
     packages=find_packages(),
-    install_requires=reqs
+    python_requires='>=3.7',
+    install_requires=reqs,
+    extras_require={
+        'export': ['pyarrow'],
+    },
+    entry_points={
+        'console_scripts': [
+            'radcalnet-archive = radcalnet.archive:main',
+            'radcalnet-export = radcalnet.export:main',
+        ],
+    },
 )
@@ -0,0 +1,82 @@
+import os
+import datetime as dt
+import numpy as np
+import pytest
+from radcalnet.archive import SiteArchive, consolidate, main
+from radcalnet.data_store import DataStore
+from radcalnet.testing import make_store
+
+
+proj_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+store_path = os.path.join(proj_dir, 'tests', 'data', 'datastore')
+tables = ['weather', 'weather_errs', 'sr', 'sr_errs', 'toa', 'toa_errs']
+
+
+def test_consolidate(tmp_path):
+    ds = DataStore(store_path)
+    archive = consolidate(ds, str(tmp_path), dtype='float64')['BTCN02']
+    assert len(archive) == 13
+    assert archive.meta['Alt'] == 1270
+    for fromtime, totime in [(None, None),
+                             (dt.datetime(2018, 5, 28, 1, 0), dt.datetime(2018, 5, 28, 2, 0)),
+                             (dt.datetime(2018, 5, 28, 4, 0), None),
+                             (None, dt.datetime(2017, 5, 1, 4, 0))]:
+        ms = ds.get_measuremets('BTCN', fromtime, totime)
+        archived = SiteArchive(archive.path)[fromtime:totime]
+        if len(ms.weather):
+            assert archived.meta == ms.meta
+        for key in tables:
+            assert len(getattr(archived, key)) == len(getattr(ms, key))
+            if len(getattr(ms, key)):
+                assert getattr(archived, key).equals(getattr(ms, key))
+
+    # updating an up to date archive is a no-op
+    assert archive.append_files([h.path for h in ds.site_index['BTCN'].handles]) == 0
+
+
+def test_append(tmp_path):
+    store = str(tmp_path / 'store')
+    paths = sorted(make_store(store, ndays=5))
+    archive = consolidate(DataStore(store), str(tmp_path / 'full'))['BTCN02']
+    ms = DataStore(store).get_measuremets('BTCN')
+    assert len(archive) == len(ms.weather)
+    assert archive[:].toa.values.dtype == np.float32
+    np.testing.assert_allclose(archive[:].toa.values, ms.toa.values, rtol=1e-6)
+
+    partial = SiteArchive.create(str(tmp_path / 'partial'), archive.meta,
+                                 archive.header['weather_keys'],
+                                 archive.header['wavelengths'])
+    assert len(partial[:].weather) == 0
+    assert partial.append_files(paths[:4]) == 2 * 13
+    assert partial.append_files(paths) == 3 * 13
+    assert partial.header['files'] == [os.path.basename(p) for p in paths]
+    assert np.array_equal(partial.times, archive.times)
+    # data preceding the archived days can't be appended
+    late = SiteArchive.create(str(tmp_path / 'late'), archive.meta,
+                              archive.header['weather_keys'],
+                              archive.header['wavelengths'])
+    late.append_files(paths[8:])
+    with pytest.raises(AssertionError):
+        late.append_files(paths[:2])
+
+    # files without any sample, before or after the archived days
+    empty = make_store(store, ndays=1, nsamples=0, start=dt.date(2017, 12, 31)) + \
+        make_store(store, ndays=1, nsamples=0, start=dt.date(2018, 1, 6))
+    assert partial.append_files(empty) == 0
+    assert partial.header['files'][-4:] == [os.path.basename(p) for p in empty]
+    assert len(partial) == 5 * 13
+    assert partial.append_files(empty) == 0
+    archive = consolidate(DataStore(store), str(tmp_path / 'with_empty'))['BTCN02']
+    assert np.array_equal(archive.times, partial.times)
+    assert len(archive.header['files']) == len(paths) + 4
+
+    start = dt.datetime(2018, 1, 2)
+    sliced = SiteArchive(partial.path)[start:start + dt.timedelta(days=1)]
+    assert len(sliced.weather) == 13
+    assert sliced.weather.equals(ms[start:start + dt.timedelta(days=1)].weather)
+
+
+def test_main(tmp_path, capsys):
+    main([store_path, str(tmp_path), '--site', 'BTCN'])
+    assert 'BTCN02: 13 rows' in capsys.readouterr().out
+    assert len(SiteArchive(str(tmp_path / 'BTCN02'))) == 13
@@ -0,0 +1,76 @@
+import asyncio
+import datetime as dt
+import concurrent.futures
+from radcalnet import instrumentation
+from radcalnet.async_store import AsyncDataStore
+from radcalnet.cache import FileCache, MemoryCache
+from radcalnet.data_store import DataStore
+from radcalnet.testing import make_store, assert_same_measurements
+
+
+def test_get_measurements(tmp_path):
+    make_store(str(tmp_path / 'store'), ndays=4)
+    ds = DataStore(str(tmp_path / 'store'))
+    windows = [(None, None), (dt.datetime(2018, 1, 2), dt.datetime(2018, 1, 3, 3)),
+               (dt.datetime(2017, 1, 1), dt.datetime(2017, 2, 1))]
+
+    async def run(store):
+        async with store:
+            return await asyncio.gather(*[store.get_measurements('BTCN', *window)
+                                          for window in windows])
+
+    cache = FileCache(str(tmp_path / 'cache'))
+    cached = DataStore(str(tmp_path / 'store'), cache=cache)
+    with concurrent.futures.ProcessPoolExecutor(2) as executor:
+        for store in [AsyncDataStore(ds, max_pending=1),
+                      AsyncDataStore(cached),
+                      AsyncDataStore(ds, executor=executor),
+                      AsyncDataStore(cached, executor=executor)]:
+            results = asyncio.run(run(store))
+            for window, ms in zip(windows, results):
+                assert_same_measurements(ms, ds.get_measuremets('BTCN', *window))
+            assert not store._inflight
+    assert len(results[2].weather) == 0
+    # including the parses in worker processes
+    assert cache.hits + cache.misses == 2 * (8 + 4)
+
+
+def test_options(tmp_path):
+    make_store(str(tmp_path / 'store'), ndays=3, fill_fraction=0.2)
+    ds = DataStore(str(tmp_path / 'store'))
+    window = (dt.datetime(2018, 1, 2), None)
+    options = [dict(tables=['toa'], wavelengths=[490, 560], weather=['AOD']),
+               dict(skip_empty=True, compact=True), dict(weather=['WV', 'Type'])]
+
+    async def run(store):
+        async with store:
+            return await asyncio.gather(*[store.get_measurements('BTCN', *window, **kwargs)
+                                          for kwargs in options])
+
+    for store in [ds, DataStore(str(tmp_path / 'store'), memory_cache=MemoryCache()),
+                  DataStore(str(tmp_path / 'store'), cache=FileCache(str(tmp_path / 'cache')))]:
+        results = asyncio.run(run(AsyncDataStore(store)))
+        for kwargs, ms in zip(options, results):
+            expected = ds.get_measuremets('BTCN', *window, **kwargs)
+            assert type(ms) is type(expected)
+            assert_same_measurements(ms, expected)
+
+
+def test_coalesce(tmp_path):
+    make_store(str(tmp_path), ndays=3)
+
+    async def run():
+        async with AsyncDataStore(str(tmp_path)) as store:
+            return await asyncio.gather(
+                store.get_measurements('BTCN'), store.get_measurements('BTCN'),
+                store.get_measurements('BTCN', dt.datetime(2018, 1, 2)))
+
+    with instrumentation.record() as stats:
+        ms1, ms2, ms3 = asyncio.run(run())
+    assert stats.as_dict()['counts']['files_read'] == 6 + 4
+    # coalesced requests get their own copy
+    assert ms1 is not ms2
+    assert_same_measurements(ms1, ms2)
+    ms2.toa.loc[:, 500] = 0
+    assert (ms1.toa[500] > 0).all()
+    assert len(ms3.weather) == 2 * 13
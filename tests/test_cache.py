@@ -0,0 +1,165 @@
+import os
+import datetime as dt
+import numpy as np
+import pytest
+from radcalnet.cache import FileCache, MemoryCache
+from radcalnet.data_store import DataStore
+from radcalnet.loading import _read_masked
+from radcalnet.testing import make_store, assert_same_measurements
+
+
+proj_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+store_path = os.path.join(proj_dir, 'tests', 'data', 'datastore')
+inputfile_path = os.path.join(
+    store_path, 'BTCN', 'BTCN02_2018_148_v00.03.input')
+
+
+class CountingLoader:
+    def __init__(self):
+        self.paths = []
+
+    def __call__(self, path):
+        self.paths.append(path)
+        return _read_masked(path)
+
+
+def test_file_cache(tmp_path):
+    cache = FileCache(str(tmp_path / 'cache'))
+    loader = CountingLoader()
+    arrays = cache.get(inputfile_path, loader)
+    cached = cache.get(inputfile_path, loader)
+    assert loader.paths == [inputfile_path]
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert cached.metadata == arrays.metadata
+    assert cached.weather_keys == arrays.weather_keys
+    for key in ['times', 'types', 'wavelengths']:
+        assert np.array_equal(getattr(cached, key), getattr(arrays, key))
+    for key in ['weather', 'weather_errs', 'srf', 'srf_errs']:
+        assert np.array_equal(getattr(cached, key), getattr(arrays, key), equal_nan=True)
+    assert np.isnan(cached.srf).any()
+
+    # a new cache instance uses the existing entries
+    cache = FileCache(str(tmp_path / 'cache'))
+    cache.get(inputfile_path, loader)
+    assert len(loader.paths) == 1
+
+
+def test_invalidation(tmp_path):
+    path, = [p for p in make_store(str(tmp_path / 'store'), ndays=1)
+             if p.endswith('input')]
+    cache = FileCache(str(tmp_path / 'cache'))
+    loader = CountingLoader()
+    cache.get(path, loader)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    cache.get(path, loader)
+    assert len(loader.paths) == 2
+
+
+def test_eviction(tmp_path):
+    paths = make_store(str(tmp_path / 'store'), ndays=4)
+    cache = FileCache(str(tmp_path / 'cache'))
+    loader = CountingLoader()
+    cache.get(paths[0], loader)
+    entry_size = cache._nbytes
+    cache.max_bytes = 3 * entry_size
+    for path in paths[1:]:
+        cache.get(path, loader)
+    assert len(cache._entries()) == 3
+    assert cache._nbytes <= cache.max_bytes
+    # the most recently used entries are kept
+    cache.get(paths[-1], loader)
+    assert cache.hits == 1
+    cache.clear()
+    assert cache._entries() == []
+
+
+def test_concurrent_eviction(tmp_path):
+    cache = FileCache(str(tmp_path / 'cache'))
+    loader = CountingLoader()
+    arrays = cache.get(inputfile_path, loader)
+    read = cache._read
+
+    def read_evicted(entry):
+        result = read(entry)
+        os.remove(entry)  # evicted by another process, once read
+        return result
+    cache._read = read_evicted
+    cached = cache.get(inputfile_path, loader)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert np.array_equal(cached.times, arrays.times)
+
+
+def test_write(tmp_path, monkeypatch):
+    cache = FileCache(str(tmp_path / 'cache'))
+    arrays = cache.get(inputfile_path, CountingLoader())
+    # overwriting an entry does not count its size twice
+    cache._write(cache._entry_path(inputfile_path), arrays)
+    assert cache._nbytes == sum(size for _, _, size in cache._entries())
+
+    def fail(*args, **kwargs):
+        raise OSError('No space left on device')
+    monkeypatch.setattr(np, 'savez', fail)
+    cache.clear()
+    with pytest.raises(OSError):
+        cache.get(inputfile_path, CountingLoader())
+    assert os.listdir(str(tmp_path / 'cache')) == []
+
+
+def test_datastore_cache(tmp_path):
+    cache = FileCache(str(tmp_path))
+    fromtime, totime = dt.datetime(2018, 5, 28, 1, 0), dt.datetime(2018, 5, 28, 5, 0)
+    ms = DataStore(store_path).get_measuremets('BTCN', fromtime, totime)
+    ds = DataStore(store_path, cache=cache)
+    for _ in range(2):
+        cached = ds.get_measuremets('BTCN', fromtime, totime)
+        assert_same_measurements(cached, ms)
+    assert (cache.hits, cache.misses) == (2, 2)
+
+
+def test_worker_stats(tmp_path):
+    make_store(str(tmp_path / 'store'), ndays=4)
+    cache = FileCache(str(tmp_path / 'cache'))
+    ds = DataStore(str(tmp_path / 'store'), cache=cache)
+    # the stats of the worker processes are added to those of the cache
+    for _ in range(2):
+        ds.get_measuremets('BTCN', workers=2)
+    assert (cache.hits, cache.misses) == (8, 8)
+    assert cache._nbytes == sum(size for _, _, size in cache._entries())
+
+
+def test_memory_cache():
+    cache = MemoryCache(max_bytes=100)
+    cache.put('a', 1, 40)
+    cache.put('b', 2, 40)
+    assert cache.get('a') == 1  # 'b' becomes least recently used
+    cache.put('c', 3, 40)
+    assert cache.get('b') is None
+    assert (cache.get('a'), cache.get('c')) == (1, 3)
+    assert (cache.hits, cache.misses) == (3, 1)
+    assert (len(cache), cache.nbytes) == (2, 80)
+    cache.put('a', 4, 50)
+    assert (cache.get('a'), cache.nbytes) == (4, 90)
+    cache.put('big', 5, 200)
+    assert cache.get('big') is None and len(cache) == 2
+    cache.clear()
+    assert (len(cache), cache.nbytes) == (0, 0)
+
+
+def test_memory_cache_store(tmp_path):
+    make_store(str(tmp_path), ndays=10)
+    cache = MemoryCache()
+    ds = DataStore(str(tmp_path), memory_cache=cache)
+    plain = DataStore(str(tmp_path))
+    for day in range(3):
+        fromtime = dt.datetime(2018, 1, 1 + day, 3)
+        totime = fromtime + dt.timedelta(days=7)
+        ms = ds.get_measuremets('BTCN', fromtime, totime)
+        expected = plain.get_measuremets('BTCN', fromtime, totime)
+        assert_same_measurements(ms, expected)
+    # the sliding window loads a single new day at each shift
+    assert (cache.hits, cache.misses) == (7 + 7, 8 + 1 + 1)
+    assert len(cache) == 10
+    assert cache.nbytes == sum(sm.memory_usage() for sm, _ in cache._entries.values())
+    compact = ds.get_measuremets('BTCN', compact=True)
+    assert len(compact.times) == 10 * 13
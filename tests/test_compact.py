@@ -0,0 +1,77 @@
+import os
+import datetime as dt
+import numpy as np
+from radcalnet.compact import CompactSiteMeasurements
+from radcalnet.site_measurements import SiteMeasurements
+from radcalnet.data_store import DataStore
+from radcalnet.testing import make_store
+
+
+proj_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+store_path = os.path.join(proj_dir, 'tests', 'data', 'datastore')
+spectral = ['sr', 'sr_errs', 'toa', 'toa_errs']
+
+
+def test_compact():
+    ms = DataStore(store_path).get_measuremets('BTCN')
+    cms = ms.compact()
+    assert isinstance(cms, CompactSiteMeasurements)
+    assert cms.values.dtype == np.float32
+    assert cms.values.shape == (4, 13, 211)
+    assert cms.meta == ms.meta
+    for key in spectral:
+        df = getattr(cms, key)
+        assert df.index.equals(getattr(ms, key).index)
+        assert list(df.columns) == list(getattr(ms, key).columns)
+        np.testing.assert_allclose(df.values, getattr(ms, key).values, rtol=1e-6)
+        # tables are views of the shared array
+        assert np.shares_memory(df.values, cms.values)
+        assert np.shares_memory(cms.array(key), cms.values)
+    assert cms.compact() is cms
+    assert ms.compact(np.float64).to_measurements().toa.equals(ms.toa)
+    assert cms.memory_usage() < 0.6 * ms.memory_usage()
+
+    start = dt.datetime(2018, 5, 28, 4, 0)
+    sliced = cms[start:]
+    assert len(sliced.times) == len(sliced.weather) == len(sliced.sr) == 7
+    assert np.shares_memory(sliced.values, cms.values)
+    assert sliced.toa.equals(cms.toa[start:])
+    assert len(cms[:dt.datetime(2018, 1, 1)].toa) == 0
+
+    merged = cms[:start] + cms[start:]
+    assert isinstance(merged, CompactSiteMeasurements)
+    assert merged.sr.equals(cms.sr)
+    # other keys than slices select plain measurements
+    day = cms['2018-05-28']
+    assert type(day) is SiteMeasurements
+    assert day.toa.equals(cms.to_measurements().toa)
+
+
+def test_duplicates():
+    ms = DataStore(store_path).get_measuremets('BTCN')
+    other = SiteMeasurements(ms.weather, ms.weather_errs, ms.sr + 1, ms.sr_errs,
+                             ms.toa, ms.toa_errs, dict(ms.meta))
+    merged = SiteMeasurements.concat([ms, other])
+    assert merged.sr.index.has_duplicates
+    # a single row is kept per timestamp, the last one by default
+    for cms, expected in [(merged.compact(np.float64), other),
+                          (CompactSiteMeasurements.concat([ms, other]), other),
+                          (CompactSiteMeasurements.concat([ms, other], keep='first'), ms)]:
+        assert cms.values.shape == (4, 13, 211)
+        np.testing.assert_allclose(cms.sr.values, expected.sr.values, rtol=1e-6)
+        np.testing.assert_allclose(cms.toa.values, ms.toa.values, rtol=1e-6)
+
+
+def test_missing_stage(tmp_path):
+    paths = sorted(make_store(str(tmp_path), ndays=3))
+    os.remove(paths[3])  # the .output file of the 2nd day
+    ds = DataStore(str(tmp_path))
+    ms = ds.get_measuremets('BTCN')
+    cms = ds.get_measuremets('BTCN', compact=True)
+    assert isinstance(cms, CompactSiteMeasurements)
+    assert cms.present.sum(axis=1).tolist() == [39, 39, 26, 26]
+    assert np.isnan(cms.array('toa')[13:26]).all()
+    for key in spectral:
+        assert getattr(cms, key).index.equals(getattr(ms, key).index)
+        np.testing.assert_allclose(getattr(cms, key).values, getattr(ms, key).values,
+                                   rtol=1e-6)
@@ -0,0 +1,113 @@
+import os
+import gzip
+import shutil
+import tarfile
+import zipfile
+import datetime as dt
+from radcalnet import containers
+from radcalnet.cache import FileCache
+from radcalnet.daily_file import read_daily_arrays
+from radcalnet.data_store import DataStore
+from radcalnet.testing import make_store, assert_same_measurements
+
+
+window = (dt.datetime(2018, 1, 2), dt.datetime(2018, 1, 3, 3))
+
+
+def test_read_text(tmp_path):
+    make_store(str(tmp_path / 'store'), ndays=1)
+    site_dir = str(tmp_path / 'store' / 'BTCN')
+    path = os.path.join(site_dir, sorted(os.listdir(site_dir))[0])
+    with open(path, 'rb') as f, gzip.open(path + '.gz', 'wb') as gz:
+        shutil.copyfileobj(f, gz)
+    with zipfile.ZipFile(str(tmp_path / 'files.zip'), 'w') as zf:
+        zf.write(path, 'BTCN/' + os.path.basename(path))
+        zf.write(path + '.gz', os.path.basename(path) + '.gz')
+    text = containers.read_text(path)
+    member = str(tmp_path / 'files.zip') + '::BTCN/' + os.path.basename(path)
+    assert containers.read_text(member) == containers.read_text(path + '.gz') == text
+    assert containers.read_text(str(tmp_path / 'files.zip') + '::' + os.path.basename(path) + '.gz') == text
+    assert containers.basename(member) == os.path.basename(path)
+    assert containers.split(member) == (str(tmp_path / 'files.zip'), 'BTCN/' + os.path.basename(path))
+    assert read_daily_arrays(member).times.tolist() == read_daily_arrays(path).times.tolist()
+
+    # the same text, wherever the file is stored
+    raw = str(tmp_path / 'notes.txt')
+    with open(raw, 'wb') as f:
+        f.write('Site:\tBTCN02 \u00e9\r\n'.encode(containers.encoding))
+    with zipfile.ZipFile(str(tmp_path / 'notes.zip'), 'w') as zf:
+        zf.write(raw, 'notes.txt')
+    assert containers.read_text(raw) == containers.read_text(str(tmp_path / 'notes.zip') + '::notes.txt') == \
+        'Site:\tBTCN02 \u00e9\n'
+
+
+def test_archive_store(tmp_path):
+    store = str(tmp_path / 'store')
+    make_store(store, ndays=4, instruments=('BTCN02', 'RVUS01'))
+    ds = DataStore(store)
+    with zipfile.ZipFile(str(tmp_path / 'store.zip'), 'w', zipfile.ZIP_DEFLATED) as zf:
+        for site in ['BTCN', 'RVUS']:
+            for fname in os.listdir(os.path.join(store, site)):
+                zf.write(os.path.join(store, site, fname), 'data/{}/{}'.format(site, fname))
+    with tarfile.open(str(tmp_path / 'store.tar.gz'), 'w:gz') as tf:
+        tf.add(store, 'store')
+    # a site directory with plain, gzip-compressed and archived files
+    mixed = str(tmp_path / 'mixed')
+    shutil.copytree(store, mixed)
+    fnames = sorted(os.listdir(os.path.join(mixed, 'BTCN')))
+    with tarfile.open(os.path.join(mixed, 'BTCN', '2018.tar'), 'w') as tf:
+        for fname in fnames[:4]:
+            tf.add(os.path.join(mixed, 'BTCN', fname), fname)
+            os.remove(os.path.join(mixed, 'BTCN', fname))
+    for fname in fnames[4:6]:
+        path = os.path.join(mixed, 'BTCN', fname)
+        with open(path, 'rb') as f, gzip.open(path + '.gz', 'wb') as gz:
+            shutil.copyfileobj(f, gz)
+        os.remove(path)
+
+    index_path = str(tmp_path / 'index.json')
+    stores = [DataStore(str(tmp_path / 'store.zip')),
+              DataStore(str(tmp_path / 'store.tar.gz'), cache=FileCache(str(tmp_path / 'cache'))),
+              DataStore(mixed, index_path=index_path)]
+    for archive_ds in stores:
+        assert sorted(archive_ds.site_dirs) == ['BTCN', 'RVUS']
+        for site in ['BTCN', 'RVUS']:
+            assert len(archive_ds.site_index[site].handles) == 8
+            assert_same_measurements(archive_ds.get_measuremets(site), ds.get_measuremets(site))
+            assert_same_measurements(archive_ds.get_measuremets(site, *window, workers=2),
+                                     ds.get_measuremets(site, *window))
+        assert archive_ds.refresh() == []
+    assert stores[2].site_index['BTCN']._archives == {'2018.tar'}
+
+    # the snapshot keeps the archive members
+    snapshot_ds = DataStore(mixed, index_path=index_path)
+    assert snapshot_ds.site_index['BTCN'][:] == stores[2].site_index['BTCN'][:]
+    assert_same_measurements(snapshot_ds.get_measuremets('BTCN'), ds.get_measuremets('BTCN'))
+
+    # archives replaced in place are listed again
+    with tarfile.open(os.path.join(mixed, 'BTCN', '2018.tar'), 'w') as tf:
+        tf.add(os.path.join(store, 'BTCN', fnames[0]), fnames[0])
+    os.utime(os.path.join(mixed, 'BTCN', '2018.tar'), ns=(0, 10**9))
+    assert stores[2].refresh() == ['BTCN']
+    assert len(stores[2].site_index['BTCN'].handles) == 5
+
+
+def test_archive_eviction(tmp_path, monkeypatch):
+    make_store(str(tmp_path / 'store'), ndays=1)
+    site_dir = str(tmp_path / 'store' / 'BTCN')
+    fname = sorted(os.listdir(site_dir))[0]
+    paths = []
+    for i in range(3):
+        paths.append(str(tmp_path / '{}.zip'.format(i)))
+        with zipfile.ZipFile(paths[-1], 'w') as zf:
+            zf.write(os.path.join(site_dir, fname), fname)
+    monkeypatch.setattr(containers, '_open', type(containers._open)())
+    monkeypatch.setattr(containers, '_max_open', 2)
+    archives = [containers._archive(path) for path in paths]
+    assert len(containers._open) == 2
+    # the evicted archive is closed, and opened again if read
+    assert archives[0]._zip is None
+    assert archives[1]._zip is not None
+    text = containers.read_text(os.path.join(site_dir, fname))
+    assert archives[0].read(fname).decode() == text
+    archives[0].close()
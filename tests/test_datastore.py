@@ -1,6 +1,15 @@
 import os
 import datetime as dt
-from radcalnet.data_store import DataStore
+import concurrent.futures
+import pandas as pd
+import pytest
+from radcalnet import data_store, instrumentation
+from radcalnet.cache import FileCache, MemoryCache
+from radcalnet.data_store import DataStore, combine_batch
+from radcalnet.file_handle import DailyFileHandle
+from radcalnet.loading import _read_dailyfile
+from radcalnet.testing import (
+    make_store, synthetic_day, write_daily_file, daily_filename, assert_same_measurements)
 
 
 proj_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -15,3 +24,190 @@ def test_basic():
     assert len(ms.weather) == 7
     ms = ds.get_measuremets('BTCN', None, dt.datetime(2017, 5, 1, 4, 0))
     assert len(ms.weather) == 0
+
+
+def test_parallel(tmp_path):
+    make_store(str(tmp_path), ndays=6)
+    ds = DataStore(str(tmp_path))
+    ms = ds.get_measuremets('BTCN')
+    with concurrent.futures.ThreadPoolExecutor(3) as executor:
+        threaded = ds.get_measuremets('BTCN', executor=executor)
+    forked = ds.get_measuremets('BTCN', dt.datetime(2018, 1, 1), None, workers=2)
+    assert_same_measurements(threaded, ms)
+    assert_same_measurements(forked, ms)
+
+
+class CountingHandle(DailyFileHandle):
+    count = 0
+
+    def __init__(self, path):
+        CountingHandle.count += 1
+        super().__init__(path)
+
+
+def test_index_refresh(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_store, 'DailyFileHandle', CountingHandle)
+    store = str(tmp_path / 'store')
+    index_path = str(tmp_path / 'index.json')
+    make_store(store, ndays=3)
+    ds = DataStore(store, index_path=index_path)
+    # indexes are built on first access
+    assert list(ds.site_dirs) == ['BTCN'] and len(ds.site_index) == 0
+    assert len(ds.get_measuremets('BTCN').weather) == 3 * 13
+    assert CountingHandle.count == 6
+    assert ds.refresh() == []
+
+    # only new files are parsed
+    make_store(store, ndays=4, instruments=('BTCN02', 'RVUS01'))
+    assert ds.refresh() == ['RVUS', 'BTCN']
+    assert CountingHandle.count == 8
+    assert len(ds.get_measuremets('BTCN').weather) == 4 * 13
+    assert len(ds.get_measuremets('RVUS').weather) == 4 * 13
+    os.remove(ds.site_index['BTCN'].handles[0].path)
+    ds.refresh()
+    assert len(ds.site_index['BTCN'].handles) == 7
+    assert CountingHandle.count == 16
+
+    # the snapshot is used instead of parsing filenames
+    ds2 = DataStore(store, index_path=index_path)
+    assert ds2.site_index['BTCN'][:] == ds.site_index['BTCN'][:]
+    assert ds2.site_index['RVUS'][:] == ds.site_index['RVUS'][:]
+    assert CountingHandle.count == 16
+
+
+def test_iter_measurements(tmp_path):
+    make_store(str(tmp_path), ndays=5)
+    ds = DataStore(str(tmp_path))
+    ms = ds.get_measuremets('BTCN')
+    chunks = list(ds.iter_measurements('BTCN', chunk='2D'))
+    assert [len(chunk.weather) for chunk in chunks] == [26, 26, 13]
+    for key in ['weather', 'sr_errs', 'toa']:
+        assert pd.concat([getattr(chunk, key) for chunk in chunks]).equals(getattr(ms, key))
+
+    fromtime, totime = dt.datetime(2018, 1, 1, 4, 0), dt.datetime(2018, 1, 4, 2, 0)
+    chunks = list(ds.iter_measurements('BTCN', fromtime, totime, dt.timedelta(hours=12)))
+    assert len(chunks) == 6
+    assert pd.concat([chunk.toa for chunk in chunks]).equals(
+        ds.get_measuremets('BTCN', fromtime, totime).toa)
+    assert list(ds.iter_measurements('BTCN', None, dt.datetime(2017, 1, 1))) == []
+
+    # sub-day chunks parse each file once
+    for chunk in ['5h', '30h']:
+        with instrumentation.record() as stats:
+            chunks = list(ds.iter_measurements('BTCN', fromtime, totime, chunk))
+        assert stats.as_dict()['counts']['files_read'] == len(ds.site_index['BTCN'][fromtime:totime])
+        for key in ['weather', 'sr_errs', 'toa']:
+            assert pd.concat([getattr(chunk, key) for chunk in chunks]).equals(
+                getattr(ds.get_measuremets('BTCN', fromtime, totime), key))
+    with pytest.raises(AssertionError):
+        next(ds.iter_measurements('BTCN', chunk='3 fortnights'))
+
+
+def test_batch(tmp_path, monkeypatch):
+    make_store(str(tmp_path), ndays=3, instruments=('BTCN02', 'RVUS01', 'GONA01'))
+    ds = DataStore(str(tmp_path))
+    window = (dt.datetime(2018, 1, 2), dt.datetime(2018, 1, 3, 3, 0))
+    queries = ['BTCN', ('RVUS01',) + window, ('GONA',) + window, ('GONA01', None, window[1])]
+    parsed = []
+
+    def read(path, cache=None):
+        parsed.append(path)
+        return _read_dailyfile(path, cache)
+    monkeypatch.setattr(data_store, '_read_dailyfile', read)
+    results = ds.get_batch(queries)
+    # files shared by queries are parsed once
+    assert len(parsed) == len(set(parsed)) == 6 + 4 + 6
+
+    for query in queries:
+        code, fromtime, totime = (query, None, None) if isinstance(query, str) else query
+        ms = ds.get_measuremets(code[:4], fromtime, totime)
+        assert_same_measurements(results[query], ms)
+
+    toa = combine_batch(results, 'toa')
+    assert toa.index.names == ['query', 'instrument', 'time']
+    assert [len(toa.loc[i]) for i in range(len(queries))] == [3 * 13, 13 + 5, 13 + 5, 2 * 13 + 5]
+    assert toa.loc[2].index.get_level_values('instrument').unique().tolist() == ['GONA01']
+    assert toa.loc[3].index.get_level_values('instrument').unique().tolist() == ['GONA01']
+    empty = ds.get_batch([('RVUS', None, dt.datetime(2017, 1, 1)), ('GONA', None, dt.datetime(2017, 1, 1))])
+    assert len(combine_batch(empty, 'toa')) == 0
+    # time range queries may be given as lists
+    listed = ds.get_batch([['RVUS01', *window]])
+    assert list(listed) == [('RVUS01',) + window]
+    assert listed[('RVUS01',) + window].toa.equals(results[queries[1]].toa)
+
+
+def test_missing_summary(tmp_path):
+    make_store(str(tmp_path), ndays=2, fill_fraction=0.25)
+    make_store(str(tmp_path), ndays=1, start=dt.date(2018, 1, 3), fill_fraction=1.)
+    ds = DataStore(str(tmp_path), memory_cache=MemoryCache())
+    summary = ds.missing_summary('BTCN')
+    assert summary.index.tolist() == sorted(os.listdir(str(tmp_path / 'BTCN')))
+    assert (summary['rows', 'all'] == 13).all()
+    assert summary['srf', 400].tolist() == [3] * 4 + [13] * 2
+    assert (summary['srf', 2400] == 13).all()
+    assert (summary['weather'].sum(axis=1) > 0).any()
+
+    for store in [DataStore(str(tmp_path)), ds, ds]:
+        ms = store.get_measuremets('BTCN')
+        skipped = store.get_measuremets('BTCN', skip_empty=True)
+        assert len(ms.weather) == 3 * 13
+        assert len(skipped.weather) == len(skipped.toa) == 2 * 13
+        for key in ['weather', 'weather_errs', 'sr', 'sr_errs', 'toa', 'toa_errs']:
+            assert getattr(skipped, key).equals(getattr(ms, key).loc[:'2018-01-02'])
+    assert ds.get_measuremets('BTCN', dt.datetime(2018, 1, 3), skip_empty=True).meta == \
+        dict(site='BTCN', instrument='BTCN02')
+
+
+def test_projection(tmp_path):
+    make_store(str(tmp_path / 'store'), ndays=3)
+    ms = DataStore(str(tmp_path / 'store')).get_measuremets('BTCN')
+    wavelengths = [490, 560, 660]
+    weather = list(ms.weather.columns[:2])
+    stores = [DataStore(str(tmp_path / 'store')),
+              DataStore(str(tmp_path / 'store'), cache=FileCache(str(tmp_path / 'cache'))),
+              DataStore(str(tmp_path / 'store'), memory_cache=MemoryCache())]
+    for store in stores + stores[1:]:
+        with instrumentation.record() as stats:
+            toa = store.get_measuremets('BTCN', tables=['toa'], wavelengths=wavelengths,
+                                        weather=weather)
+        if store is stores[0]:
+            # the .input files are not read
+            assert stats.as_dict()['counts']['files_read'] == 3
+        assert toa.toa.equals(ms.toa[wavelengths])
+        assert len(toa.sr) == len(toa.weather) == len(toa.toa_errs) == 0
+        # empty tables hold the projected columns
+        assert list(toa.sr.columns) == list(toa.toa_errs.columns) == wavelengths
+        assert list(toa.weather.columns) == weather
+        none = store.get_measuremets('BTCN', dt.datetime(2017, 1, 1), dt.datetime(2017, 2, 1),
+                                     tables=['toa'], wavelengths=wavelengths)
+        assert len(none.toa) == 0 and list(none.toa.columns) == wavelengths
+        # wavelengths are matched as integers
+        floats = store.get_measuremets('BTCN', tables=['toa'], wavelengths=[490., 560., 660.])
+        assert floats.toa.equals(ms.toa[wavelengths])
+        with pytest.raises(AssertionError):
+            store.get_measuremets('BTCN', wavelengths=[490.5])
+        full = store.get_measuremets('BTCN', weather=weather + ['Type'])
+        assert full.weather.equals(ms.weather[weather + ['Type']])
+        assert full.weather_errs.equals(ms.weather_errs[weather])
+        assert full.sr_errs.equals(ms.sr_errs)
+
+    # skip_empty, with days without valid spectral values (2nd) or weather
+    # values (3rd)
+    store = str(tmp_path / 'skip')
+    make_store(store, ndays=1)
+    make_store(store, ndays=1, start=dt.date(2018, 1, 2), fill_fraction=1.)
+    date = dt.date(2018, 1, 3)
+    (metadata, times, weather, weather_errs,
+     sr, sr_errs, toa, toa_errs) = synthetic_day('BTCN02', date)
+    for key in weather_errs:
+        weather[key] = weather_errs[key] = [9999] * len(times)
+    for stage, srf, srf_errs in [('input', sr, sr_errs), ('output', toa, toa_errs)]:
+        write_daily_file(os.path.join(store, 'BTCN', daily_filename('BTCN02', date, stage)),
+                         metadata, times, weather, weather_errs, srf, srf_errs)
+    for ds in [DataStore(store), DataStore(store, memory_cache=MemoryCache()),
+               DataStore(store, cache=FileCache(str(tmp_path / 'cache')))]:
+        ms = ds.get_measuremets('BTCN', skip_empty=True)
+        assert ms.toa.index.normalize().unique().day.tolist() == [1, 3]
+        # judged on the weather values, when only weather tables are loaded
+        ms = ds.get_measuremets('BTCN', skip_empty=True, tables=['weather'])
+        assert ms.weather.index.normalize().unique().day.tolist() == [1, 2]
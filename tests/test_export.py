@@ -0,0 +1,50 @@
+import os
+import datetime as dt
+import pytest
+from radcalnet.data_store import DataStore
+from radcalnet.testing import make_store
+
+pytest.importorskip('pyarrow')
+from radcalnet.export import ColumnarStore, export_store, main  # noqa: E402
+
+
+tables = ['weather', 'weather_errs', 'sr', 'sr_errs', 'toa', 'toa_errs']
+
+
+@pytest.mark.parametrize('fmt', ['parquet', 'arrow'])
+def test_export(tmp_path, fmt):
+    make_store(str(tmp_path / 'store'), instruments=('BTCN02', 'RVUS01'),
+               ndays=4, day_step=150, fill_fraction=0.2)
+    ds = DataStore(str(tmp_path / 'store'))
+    written = export_store(ds, str(tmp_path / 'dest'), fmt=fmt, row_group_size=13)
+    assert len(written) == 2 * 2 * 6
+    assert os.path.exists(str(tmp_path / 'dest' / 'toa' / 'site=RVUS' / 'year=2019'))
+
+    # stray entries of the partition directories are ignored
+    os.makedirs(str(tmp_path / 'dest' / 'toa' / 'site=BTCN' / '.tmp'))
+    (tmp_path / 'dest' / 'toa' / 'site=BTCN' / 'notes.txt').write_text('')
+    store = ColumnarStore(str(tmp_path / 'dest'), fmt)
+    for site in ['BTCN', 'RVUS']:
+        for window in [(None, None), (dt.datetime(2018, 5, 30, 3), dt.datetime(2019, 1, 1)),
+                       (dt.datetime(2018, 12, 1), None), (None, dt.datetime(2017, 1, 1))]:
+            ms = ds.get_measuremets(site, *window)
+            exported = store.get_measuremets(site, *window)
+            assert exported.meta == ms.meta
+            for key in tables:
+                assert getattr(exported, key).equals(getattr(ms, key)), key
+
+    subset = store.get_measuremets('BTCN', dt.datetime(2018, 5, 1), dt.datetime(2018, 6, 30),
+                                   wavelengths=[490, 560, 660])
+    assert list(subset.toa.columns) == [490, 560, 660]
+    assert len(subset.toa) == 13
+    ms = ds.get_measuremets('BTCN', dt.datetime(2018, 5, 1), dt.datetime(2018, 6, 30))
+    assert subset.toa.equals(ms.toa[[490, 560, 660]])
+    assert subset.weather.equals(ms.weather)
+
+
+def test_main(tmp_path, capsys):
+    make_store(str(tmp_path / 'store'), ndays=2)
+    main([str(tmp_path / 'store'), str(tmp_path / 'dest'), '--site', 'BTCN'])
+    assert '6 files written' in capsys.readouterr().out
+    ms = ColumnarStore(str(tmp_path / 'dest')).get_measuremets('BTCN')
+    assert len(ms.toa) == 2 * 13
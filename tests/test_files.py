@@ -1,7 +1,10 @@
 import os
+import numpy as np
 from radcalnet.daily_file import (
-    block_iter, parse_metadata_block, read_daily_file)
+    block_iter, parse_metadata_block, parse_main_data_block,
+    parse_errors_data_block, read_daily_arrays, read_daily_file)
 from radcalnet.file_handle import DailyFileHandle
+from radcalnet.testing import make_store
 
 
 proj_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -60,3 +63,49 @@ def test_read_daily_file():
         assert len(vals) == len(times1)
     for vals in toa.values():
         assert len(vals) == len(times1)
+
+
+def _read_daily_file_by_lines(path):
+    """
+    Reference parser, converting the values line by line
+    """
+    with open(path, 'rt') as f:
+        blockiter = iter(block_iter(f))
+        metadata = parse_metadata_block(next(blockiter))
+        times, weather, srf = parse_main_data_block(next(blockiter))
+        weather_errs, srf_errs = parse_errors_data_block(next(blockiter))
+    return metadata, times, weather, weather_errs, srf, srf_errs
+
+
+def test_read_daily_arrays(tmp_path):
+    paths = [inputfile_path, outputfile_path] + make_store(str(tmp_path), ndays=2)
+    # files without any sample
+    paths += make_store(str(tmp_path / 'empty'), ndays=1, nsamples=0)
+    # blocks separated by several blank lines
+    with open(outputfile_path, 'rt') as f:
+        text = f.read()
+    paths.append(str(tmp_path / 'BTCN02_2018_148_v02.03.output'))
+    with open(paths[-1], 'wt') as f:
+        f.write(text.replace('\n\n', '\n\n \n\n'))
+    for path in paths:
+        (metadata, times, weather,
+         weather_errs, srf, srf_errs) = _read_daily_file_by_lines(path)
+        assert read_daily_file(path) == (
+            metadata, times, weather, weather_errs, srf, srf_errs)
+
+        arrays = read_daily_arrays(path)
+        assert arrays.metadata == metadata
+        assert arrays.times.dtype == np.dtype('datetime64[ns]')
+        assert list(arrays.times) == list(np.array(times, dtype='datetime64[ns]'))
+        assert arrays.weather_keys == ['P', 'T', 'WV', 'O3', 'AOD', 'Ang']
+        assert arrays.weather.shape == (len(times), 6)
+        assert list(arrays.types) == weather['Type']
+        assert arrays.wavelengths.dtype.kind == 'i'
+        assert list(arrays.wavelengths) == list(srf.keys())
+        assert arrays.srf.shape == arrays.srf_errs.shape == (len(times), 211)
+        for i, key in enumerate(arrays.weather_keys):
+            assert np.array_equal(arrays.weather[:, i], weather[key])
+            assert np.array_equal(arrays.weather_errs[:, i], weather_errs[key])
+        for i, wv in enumerate(arrays.wavelengths):
+            assert np.array_equal(arrays.srf[:, i], srf[wv])
+            assert np.array_equal(arrays.srf_errs[:, i], srf_errs[wv])
@@ -0,0 +1,26 @@
+import sys
+import json
+import subprocess
+
+
+def _imported(module):
+    """
+    Import `module` in a fresh interpreter
+    :return: set of the (top-level) modules loaded by the import
+    """
+    code = ('import sys, json, {}; '
+            'print(json.dumps(sorted(sys.modules)))'.format(module))
+    out = subprocess.run([sys.executable, '-c', code], check=True,
+                         stdout=subprocess.PIPE, universal_newlines=True).stdout
+    return {name.partition('.')[0] for name in json.loads(out)}
+
+
+def test_lazy_imports():
+    for module in ['radcalnet.daily_file', 'radcalnet.file_handle',
+                   'radcalnet.data_store', 'radcalnet.cache']:
+        imported = _imported(module)
+        assert 'pandas' not in imported, module
+        assert 'matplotlib' not in imported, module
+    imported = _imported('radcalnet.site_measurements')
+    assert 'pandas' in imported
+    assert 'matplotlib' not in imported
@@ -0,0 +1,54 @@
+import os
+import logging
+from radcalnet import instrumentation
+from radcalnet.data_store import DataStore
+from radcalnet.testing import make_store
+
+
+def test_record(tmp_path):
+    make_store(str(tmp_path), ndays=3)
+    ds = DataStore(str(tmp_path))
+    ds.get_measuremets('BTCN')  # not recorded
+    assert not instrumentation._recorders
+
+    with instrumentation.record() as stats:
+        ms = ds.get_measuremets('BTCN')
+    assert not instrumentation._recorders
+    result = stats.as_dict()
+    assert result['counts']['files_read'] == 6
+    assert result['counts']['rows_parsed'] == 6 * 13
+    assert result['counts']['chars_read'] == sum(
+        os.path.getsize(path) for path in ds.site_index['BTCN'][None:None])
+    for stage in ['get_measurements', 'read', 'parse', 'mask', 'frames', 'concat']:
+        assert result['stages'][stage]['seconds'] > 0
+    assert result['stages']['read']['calls'] == 6
+    assert result['stages']['get_measurements']['calls'] == 1
+    assert len(ms.weather) == 3 * 13
+
+    with instrumentation.record() as outer:
+        with instrumentation.record() as inner:
+            DataStore(str(tmp_path)).get_measuremets('BTCN')
+    assert outer.as_dict()['counts'] == inner.as_dict()['counts']
+    assert inner.as_dict()['counts']['dirs_listed'] == 1
+
+    # merges of measurements, by `+` or `concat`
+    with instrumentation.record() as stats:
+        merged = ms[:ms.weather.index[20]] + ms[ms.weather.index[10]:]
+        merged = merged.concat([merged, ms, ms])
+    result = stats.as_dict()
+    assert result['counts']['merges'] == 2
+    assert result['stages']['merge']['calls'] == 2
+    assert result['stages']['merge']['seconds'] > 0
+    assert 'files_read' not in result['counts']
+    assert merged.weather.equals(ms.weather)
+
+
+def test_log(caplog):
+    stats = instrumentation.Stats()
+    stats.add_time('parse', 0.5)
+    stats.add_time('parse', 0.25)
+    stats.add_count('files_read', 2)
+    with caplog.at_level(logging.INFO, logger='radcalnet'):
+        stats.log()
+    assert 'stage parse: 0.750000s in 2 calls' in caplog.text
+    assert 'count files_read: 2' in caplog.text
@@ -0,0 +1,59 @@
+import datetime as dt
+import pytest
+from radcalnet.cache import FileCache
+from radcalnet.live import LiveSiteMeasurements
+from radcalnet.site_measurements import SiteMeasurements
+from radcalnet.testing import make_store, assert_same_measurements, table_keys
+
+
+def test_append_files(tmp_path):
+    paths = sorted(make_store(str(tmp_path / 'store'), ndays=6, fill_fraction=0.2))
+    live = LiveSiteMeasurements(cache=FileCache(str(tmp_path / 'cache')))
+    assert len(live.toa) == 0 and live.meta == {}
+    # .input files first, then the .output file of the day
+    for i in range(0, len(paths), 2):
+        assert live.append_files(paths[i:i + 1]) == 1
+        live.append_files(paths[i + 1:i + 2])
+        assert_same_measurements(live, SiteMeasurements.from_pathlist(paths[:i + 2]))
+    # late files are merged in
+    late = LiveSiteMeasurements('BTCN02')
+    late.append_files(paths[4:])
+    late.append_files(paths[:4])
+    assert_same_measurements(late, live)
+    late.append_files(paths[2:4])
+    assert_same_measurements(late, live)
+
+    assert_same_measurements(live.to_measurements(), live)
+    assert_same_measurements(live[dt.datetime(2018, 1, 2):], SiteMeasurements.from_pathlist(paths[2:]))
+    assert_same_measurements(live + live.to_measurements(), live)
+    # the inherited constructors build plain measurements
+    for sm in [LiveSiteMeasurements.concat([live, live]), LiveSiteMeasurements.from_pathlist(paths),
+               LiveSiteMeasurements._from_parts([live[:dt.datetime(2018, 1, 2)],
+                                                 live[dt.datetime(2018, 1, 2):]], live.meta)]:
+        assert type(sm) is SiteMeasurements
+        assert_same_measurements(sm, live)
+    assert type(live[dt.datetime(2018, 1, 2):]) is SiteMeasurements
+    daily, _ = live.resample('1D')
+    assert len(daily.toa) == 6
+
+    other = make_store(str(tmp_path / 'other'), ndays=1, instruments=('RVUS01',))
+    assert live.append_files(other) == 0
+    with pytest.raises(AssertionError):
+        live.extend(SiteMeasurements.from_pathlist(other))
+
+
+def test_retention(tmp_path):
+    paths = sorted(make_store(str(tmp_path), ndays=40))
+    live = LiveSiteMeasurements(retention='3D')
+    capacities = set()
+    for i in range(0, len(paths), 2):
+        live.append_files(paths[i:i + 2])
+        capacities.add(len(live._buffers['toa'].times))
+        latest = live.toa.index[-1]
+        expected = SiteMeasurements.from_pathlist(paths[:i + 2])[latest - dt.timedelta(days=3):]
+        assert_same_measurements(live, expected)
+    # the buffers reached a steady size
+    assert len(capacities) <= 3 and max(capacities) <= 2 * 4 * 13 * 2
+    assert live.memory_usage() < SiteMeasurements.from_pathlist(paths).memory_usage()
+    assert live.drop_before(dt.datetime(2018, 2, 9)) == dict.fromkeys(table_keys, 1 + 2 * 13)
+    assert len(live.weather) == 13
@@ -2,7 +2,10 @@ import os
 import glob
 import datetime as dt
 import numpy as np
-from radcalnet.site_measurements import SiteMeasurements, _process_dailyfile
+import pytest
+from radcalnet.site_measurements import (
+    SiteMeasurements, _process_dailyfile, _dataframe_concat)
+from radcalnet.testing import make_store
 
 
 proj_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
@@ -44,6 +47,23 @@ def test_basic():
     assert np.all((avg_toa < avg_sr)[-30:])
 
 
+def test_bulk_load(tmp_path):
+    pathlist = make_store(str(tmp_path), ndays=5)
+    sm = SiteMeasurements.from_pathlist(pathlist)
+    assert len(sm.weather) == 5 * 13
+    assert sm.weather.index.is_monotonic_increasing
+    assert list(sm.weather.columns) == ['P', 'T', 'WV', 'O3', 'AOD', 'Ang', 'Type']
+
+    # compare with merging the files in any order
+    frames = {'weather': [], 'sr': [], 'toa': []}
+    for path in sorted(pathlist, reverse=True):
+        weather, _, srf, _, _ = _process_dailyfile(path)
+        frames['weather'].append(weather)
+        frames['sr' if path.endswith('input') else 'toa'].append(srf)
+    for key, dfs in frames.items():
+        assert getattr(sm, key).equals(_dataframe_concat(dfs, key))
+
+
 def test_ops():
     pathlist = glob.glob(os.path.join(store_path, 'BTCN', '*'))
     sm = SiteMeasurements.from_pathlist(pathlist)
@@ -73,6 +93,35 @@ def test_ops():
     assert np.all((sm2 + sm3).weather['T'].values == sm1.weather['T'].values)
 
 
+def test_concat(tmp_path):
+    pathlist = make_store(str(tmp_path), ndays=6)
+    sm = SiteMeasurements.from_pathlist(pathlist)
+    times = sm.weather.index
+    parts = [sm[:times[20]], sm[times[30]:], sm[times[10]:times[40]]]
+    keys = ['weather', 'weather_errs', 'sr', 'sr_errs', 'toa', 'toa_errs']
+
+    merged = SiteMeasurements.concat(parts)
+    chained = parts[0] + parts[1] + parts[2]
+    for key in keys:
+        assert getattr(merged, key).equals(getattr(sm, key))
+        assert getattr(chained, key).equals(getattr(sm, key))
+    assert list(merged.weather.columns) == ['P', 'T', 'WV', 'O3', 'AOD', 'Ang', 'Type']
+
+    # overlapping timestamps holding different values
+    shifted = sm[times[10]:times[40]]
+    shifted.weather = shifted.weather.assign(T=shifted.weather['T'] + 1)
+    merged = SiteMeasurements.concat([sm, shifted])
+    assert len(merged.weather) == len(times) + 31
+    first = SiteMeasurements.concat([sm, shifted], keep='first')
+    last = SiteMeasurements.concat([sm, shifted], keep='last')
+    assert first.weather.equals(sm.weather)
+    assert last.weather['T'].iloc[10:41].equals(shifted.weather['T'])
+    assert last.weather['T'].iloc[41:].equals(sm.weather['T'].iloc[41:])
+    for key in keys[1:]:
+        assert getattr(first, key).equals(getattr(sm, key))
+        assert getattr(last, key).equals(getattr(sm, key))
+
+
 def test_plot():
     pathlist = glob.glob(os.path.join(store_path, 'BTCN', '*'))
     sm = SiteMeasurements.from_pathlist(pathlist)[dt.datetime(2018, 5, 28):dt.datetime(2018, 5, 29)]
@@ -82,3 +131,197 @@ def test_plot():
         for measurements in ['toa', 'O3', ['O3', 'T']]:
             spectrum = range(400, 430) if 'toa'in measurements else None
             sm.plot(measurements, spectrum, with_errors=with_errors, show=False)
+
+
+def test_plot_decimated(tmp_path):
+    from radcalnet import plotting
+    pathlist = make_store(str(tmp_path), ndays=20, fill_fraction=0.1)
+    sm = SiteMeasurements.from_pathlist(pathlist)
+    fig = sm.plot('toa', [500, 600], fig=plotting.plt.figure(), show=False, decimate=10)
+    ax = fig.axes[0]
+    assert [line.get_label() for line in ax.lines] == ['toa at 500nm', 'toa at 600nm']
+    assert len(ax.collections) == 2
+    x, y = ax.lines[0].get_data()
+    assert len(x) == 2 * 10
+    # each bucket keeps the extremes of its samples
+    assert np.nanmax(y) == sm.toa[500].max() and np.nanmin(y) == sm.toa[500].min()
+    traces = plotting._traces(sm, 'toa', [500, 600], 10)
+    assert plotting._traces(sm, 'toa', [500, 600], 10) is traces
+    assert np.array_equal(traces[1][:, 1], ax.lines[1].get_ydata(), equal_nan=True)
+    assert np.nanmin(traces[3][:, 0]) == (sm.toa[500] - sm.toa_errs[500]).min()
+    assert np.nanmax(traces[4][:, 1]) == (sm.toa[600] + sm.toa_errs[600]).max()
+    # traces of replaced tables are computed again
+    sm.toa = sm.toa * 2
+    assert np.nanmax(plotting._traces(sm, 'toa', [500, 600], 10)[1][:, 0]) == 2 * np.nanmax(y)
+
+    # multi-year series: a bucket per (4 weeks apart) day
+    years = SiteMeasurements.from_pathlist(make_store(str(tmp_path / 'years'), ndays=40, day_step=28))
+    x, y, band_x, _, _ = plotting._traces(years, 'toa', [500], 200)
+    assert len(x) == len(band_x) == 2 * 40
+    assert (np.diff(x[:, 0]) >= np.timedelta64(0)).all()
+    assert (np.diff(band_x) >= np.timedelta64(0)).all()
+
+    fig = sm.plot(['O3', 'T'], fig=plotting.plt.figure(), show=False, decimate=True)
+    assert len(fig.axes[0].lines) == 2 and len(fig.axes[0].collections) == 2
+    # few samples are drawn as such
+    day = sm[:dt.datetime(2018, 1, 1, 23)]
+    fig = day.plot('AOD', fig=plotting.plt.figure(), show=False, with_errors=False, decimate=True)
+    assert fig.axes[0].lines[0].get_ydata().tolist() == day.weather['AOD'].tolist()
+
+
+def test_time_lookup():
+    pathlist = glob.glob(os.path.join(store_path, 'BTCN', '*'))
+    sm = SiteMeasurements.from_pathlist(pathlist)
+    t0 = dt.datetime(2018, 5, 28, 4, 0)
+    queries = [t0 + dt.timedelta(minutes=m) for m in [-2, 10, 15, 50, 400, -600]]
+    rows, offsets = sm.nearest(queries, '10min')
+    assert list(rows.index) == queries
+    assert offsets.astype('timedelta64[m]').astype(object).tolist() == [
+        dt.timedelta(minutes=2), dt.timedelta(minutes=-10), None,
+        dt.timedelta(minutes=10), None, None]
+    assert np.array_equal(rows.iloc[0].values, sm.toa.loc[t0].values, equal_nan=True)
+    assert np.array_equal(rows.iloc[1].values, sm.toa.loc[t0].values, equal_nan=True)
+    assert np.array_equal(rows.iloc[3].values, sm.toa.iloc[8].values, equal_nan=True)
+    assert rows.iloc[[2, 4, 5]].isna().all().all()
+
+    rows, offsets = sm.nearest(queries, table='weather')
+    assert rows['T'].tolist() == sm.weather['T'].iloc[[6, 6, 6, 8, 12, 0]].tolist()
+    assert rows['Type'].tolist() == ['R'] * 6
+    assert offsets[4] == np.timedelta64(-220, 'm')
+
+    rows, offsets = sm.within(queries, dt.timedelta(minutes=30), table='sr')
+    assert rows.index.names == ['query', 'time']
+    assert rows.index.get_level_values('query').tolist() == [0, 0, 1, 1, 2, 2, 3, 3]
+    assert np.all(np.abs(offsets) <= np.timedelta64(30, 'm'))
+    assert np.array_equal(rows.loc[3].values, sm.sr.iloc[[7, 8]].values, equal_nan=True)
+
+    single = sm[t0:t0]
+    rows, offsets = single.nearest(queries, '10min')
+    assert offsets.astype('timedelta64[m]').astype(object).tolist() == [
+        dt.timedelta(minutes=2), dt.timedelta(minutes=-10), None, None, None, None]
+    assert np.array_equal(rows.iloc[0].values, sm.toa.loc[t0].values, equal_nan=True)
+    assert single.interpolate_to([t0, queries[0]]).weather['Type'].notna().tolist() == [True, False]
+
+    empty = sm[:dt.datetime(2018, 1, 1)]
+    rows, offsets = empty.nearest(queries)
+    assert rows.isna().all().all() and np.isnat(offsets).all()
+    rows, offsets = empty.within(queries, '1h')
+    assert len(rows) == len(offsets) == 0
+
+
+def test_band_average():
+    pathlist = glob.glob(os.path.join(store_path, 'BTCN', '*'))
+    sm = SiteMeasurements.from_pathlist(pathlist)
+    srfs = {
+        'narrow': ([558, 560, 562], [0, 1, 0]),
+        'box': (np.arange(600, 701), np.ones(101)),
+        'swir': ([2400, 2450, 2500], [0.5, 1, 0.5]),
+    }
+    values, errors = sm.band_average(srfs)
+    assert list(values.columns) == list(errors.columns) == list(srfs)
+    assert values.index.equals(sm.toa.index)
+    np.testing.assert_allclose(values['narrow'], sm.toa[560])
+    np.testing.assert_allclose(errors['narrow'], sm.toa_errs[560])
+    # 1nm intervals of [600, 700] fall half on 600 and 700, and evenly on others
+    weights = np.array([5] + [10] * 9 + [5]) / 100
+    box = sm.toa.loc[:, 600:700].values @ weights
+    np.testing.assert_allclose(values['box'], box)
+    box_errs = np.sqrt(np.square(sm.toa_errs.loc[:, 600:700].values) @ weights ** 2)
+    np.testing.assert_allclose(errors['box'], box_errs)
+    _, correlated = sm.band_average(srfs, correlated=True)
+    np.testing.assert_allclose(correlated['box'], sm.toa_errs.loc[:, 600:700].values @ weights)
+    # the SWIR end of the fixture holds fill values
+    assert values['swir'].isna().all()
+
+    # min_coverage is inclusive: fully covered bands pass 1.0
+    values, errors = sm.band_average(srfs, min_coverage=1.)
+    np.testing.assert_allclose(values['box'], box)
+    np.testing.assert_allclose(values['narrow'], sm.toa[560])
+
+    # projections must keep a contiguous range, covering the responses
+    subset = SiteMeasurements.from_pathlist(pathlist, wavelengths=range(550, 710, 10))
+    values, _ = subset.band_average({key: srfs[key] for key in ['narrow', 'box']})
+    np.testing.assert_allclose(values['box'], box)
+    for wavelengths, bands in [([490, 560, 660], ['narrow']), (range(550, 710, 10), ['swir'])]:
+        subset = SiteMeasurements.from_pathlist(pathlist, wavelengths=wavelengths)
+        with pytest.raises(AssertionError):
+            subset.band_average({key: srfs[key] for key in bands})
+
+    # NaN samples are left out of the average
+    sm.sr.loc[:, 650] = np.nan
+    values, errors = sm.band_average(srfs, 'sr', min_coverage=0.8)
+    others = np.delete(weights, 5)
+    expected = sm.sr.loc[:, 600:700].drop(columns=650).values @ others / others.sum()
+    np.testing.assert_allclose(values['box'], expected)
+    values, errors = sm.band_average(srfs, 'sr', min_coverage=0.95)
+    assert values['box'].isna().all() and errors['box'].isna().all()
+    values, _ = sm.band_average(srfs, 'sr', min_coverage=1 - weights[5])
+    np.testing.assert_allclose(values['box'], expected)
+
+
+def test_resample(tmp_path):
+    pathlist = make_store(str(tmp_path), ndays=3, fill_fraction=0.25)
+    sm = SiteMeasurements.from_pathlist(pathlist)
+    daily, counts = sm.resample('1D')
+    valid = sm.toa.notna()
+    assert daily.toa.index.tolist() == [dt.datetime(2018, 1, d) for d in [1, 2, 3]]
+    np.testing.assert_allclose(daily.toa, sm.toa.resample('1D').mean())
+    assert counts['toa'].equals(valid.resample('1D').sum())
+    expected = np.sqrt(np.square(sm.toa_errs.where(valid)).resample('1D').sum()) / counts['toa']
+    np.testing.assert_allclose(daily.toa_errs, expected.where(counts['toa'] > 0))
+    correlated, _ = sm.resample('1D', correlated=True)
+    np.testing.assert_allclose(correlated.sr_errs, sm.sr_errs.where(sm.sr.notna()).resample('1D').mean())
+    assert daily.weather['Type'].tolist() == ['R'] * 3
+    np.testing.assert_allclose(daily.weather.drop(columns='Type'),
+                               sm.weather.drop(columns='Type').resample('1D').mean())
+
+    maxima, _ = sm.resample('12h', how='max', origin=dt.datetime(2018, 1, 1, 3))
+    assert maxima.sr.index[0] == dt.datetime(2017, 12, 31, 15)
+    np.testing.assert_allclose(maxima.sr, sm.sr.resample('12h', offset='3h').max().dropna(how='all'))
+    first = sm.sr.loc[:'2018-01-01 02:59']
+    rows = np.argmax(np.nan_to_num(first.values, nan=-np.inf), axis=0)
+    cols = ~first.isna().all().values
+    np.testing.assert_allclose(maxima.sr_errs.values[0, cols],
+                               sm.sr_errs.loc[:'2018-01-01 02:59'].values[rows[cols], cols])
+
+    empty, counts = sm[:dt.datetime(2017, 1, 1)].resample('1D', how='min')
+    assert len(empty.toa) == len(counts['weather']) == 0
+
+
+def test_interpolate_to(tmp_path):
+    pathlist = make_store(str(tmp_path), ndays=2, fill_fraction=0.25)
+    sm = SiteMeasurements.from_pathlist(pathlist)
+    times = [dt.datetime(2018, 1, 1, 0), dt.datetime(2018, 1, 1, 1), dt.datetime(2018, 1, 1, 2, 10),
+             dt.datetime(2018, 1, 1, 12), dt.datetime(2018, 1, 2, 7), dt.datetime(2018, 1, 3)]
+    interp = sm.interpolate_to(times)
+    assert interp.toa.index.tolist() == times
+    expected = sm.toa.reindex(sm.toa.index.union(times)).interpolate(
+        method='time', limit_area='inside').loc[times]
+    np.testing.assert_allclose(interp.toa, expected)
+    # samples on the target times are kept, with their errors
+    np.testing.assert_allclose(interp.toa_errs.loc[times[1]], sm.toa_errs.loc[times[1]])
+    assert interp.weather['Type'].notna().tolist() == [False, True, True, True, True, False]
+
+    gaps = sm.interpolate_to(times, max_gap='1h')
+    assert gaps.toa.iloc[[0, 3, 5]].isna().all().all()
+    np.testing.assert_allclose(gaps.sr.iloc[[1, 4]], interp.sr.iloc[[1, 4]])
+    t0, t1 = sm.weather.index[2:4]
+    mid = sm.interpolate_to([t0 + (t1 - t0) / 4])
+    errs = sm.weather_errs.loc[[t0, t1], 'AOD'].values
+    assert np.isclose(mid.weather_errs['AOD'].iloc[0], np.hypot(0.75 * errs[0], 0.25 * errs[1]))
+    correlated = sm.interpolate_to([t0 + (t1 - t0) / 4], correlated=True)
+    assert np.isclose(correlated.weather_errs['AOD'].iloc[0], 0.75 * errs[0] + 0.25 * errs[1])
+
+
+def test_fill_values(tmp_path):
+    pathlist = make_store(str(tmp_path), ndays=3, day_step=400, fill_fraction=0.25)
+    sm = SiteMeasurements.from_pathlist(pathlist)
+    assert sorted({t.year for t in sm.weather.index}) == [2018, 2019, 2020]
+    for key in ['sr', 'sr_errs', 'toa', 'toa_errs']:
+        df = getattr(sm, key)
+        # the first 3 samples of each day, and the far SWIR end are missing
+        missing = df.isna()
+        assert missing.loc[:, 2400:].all().all()
+        assert missing.loc[:, :2390].sum(axis=0).tolist() == [9] * 200
+    assert sm.weather.drop(columns='Type').isna().values.any()
+    assert sm.weather.drop(columns='Type').max().max() < 9000